@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from app.schemas.itinerary_schema import TravelerPrefs, ItinerarySchema
 from app.services.itinerary_service import build_itinerary
 
@@ -12,8 +12,16 @@ async def create_itinerary(prefs: TravelerPrefs):
     """
     try:
         itinerary = await build_itinerary(prefs)
-        return itinerary
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to build itinerary: {str(e)}")
+
+    # Validate against the response schema once, then serialize straight to
+    # JSON bytes (pydantic-core) instead of FastAPI's dict → encoder pass.
+    # A schema mismatch is a server error, not a bad request.
+    try:
+        body = ItinerarySchema.model_validate(itinerary.model_dump()).model_dump_json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Invalid itinerary response: {str(e)}")
+    return Response(content=body, media_type="application/json")
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -13,6 +14,12 @@ class Settings(BaseModel):
 
     # Redis Stack
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_POOL_SIZE: int = int(os.getenv("REDIS_POOL_SIZE", "256"))
+    REDIS_ASYNC_POOL_SIZE: int = int(os.getenv("REDIS_ASYNC_POOL_SIZE", "64"))
+    # Connections opened per pool at startup, so first requests skip the handshake
+    REDIS_WARM_CONNECTIONS: int = int(os.getenv("REDIS_WARM_CONNECTIONS", "8"))
+    # Used instead of TCP when REDIS_URL points at localhost and the socket exists
+    REDIS_UNIX_SOCKET: str = os.getenv("REDIS_UNIX_SOCKET", "/var/run/redis/redis.sock")
 
     # Collections
     COLL_HOTELS: str = os.getenv("COLL_HOTELS", "hotels")
@@ -21,10 +28,38 @@ class Settings(BaseModel):
     COLL_FLIGHTS: str = os.getenv("COLL_FLIGHTS", "flights")
     COLL_TRANSPORTS: str = os.getenv("COLL_TRANSPORTS", "transports")
 
+    # Cache TTL (seconds) for Redis-backed caches
+    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))
+    # "No hub route" answers expire sooner, so newly ingested flights show up quickly
+    HUB_ROUTE_NEGATIVE_TTL: int = int(os.getenv("HUB_ROUTE_NEGATIVE_TTL", "60"))
+    # Short in-process cache for repeated identical vector searches
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+    SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+    # Element type of the Redis vector fields: FLOAT32 (default) or FLOAT16
+    # (half the index RAM / KNN bandwidth; needs RediSearch 2.10+ and a FT.CREATE
+    # of the indexes). Mongo always keeps the float32 embeddings.
+    VECTOR_TYPE: str = os.getenv("VECTOR_TYPE", "FLOAT32").upper()
+
+    # Cross-process (Redis) cache for retrieve_* results
+    RETRIEVAL_CACHE_TTL: int = int(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+
+    # Gemini call bounds (per-request timeout, output cap, retries)
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "30"))
+    LLM_MAX_OUTPUT_TOKENS: int = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1024"))
+    LLM_MAX_ATTEMPTS: int = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
-    # Allow extra .env variables without throwing validation errors
-    model_config = {"extra": "allow"}
+    # Allow extra .env variables without throwing validation errors;
+    # frozen makes the instance immutable and hashable.
+    model_config = {"extra": "allow", "frozen": True}
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Process-wide settings, parsed once (usable as a FastAPI dependency)."""
+    return Settings()
+
 
-settings = Settings()
+settings = get_settings()
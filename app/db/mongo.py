@@ -3,22 +3,42 @@
 # -------------------------------------------------------------
 from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo.errors import OperationFailure
 from app.config import settings
-import traceback
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 _mongo_client: Optional[AsyncIOMotorClient] = None
 _mongo_db: Optional[AsyncIOMotorDatabase] = None
 _lock = asyncio.Lock()
 
 
+def _new_client() -> AsyncIOMotorClient:
+    """
+    Build the single process-wide Motor client (one connection pool).
+    A small warm pool avoids paying the handshake on the first request.
+    """
+    return AsyncIOMotorClient(
+        settings.MONGO_URI,
+        maxPoolSize=20,
+        minPoolSize=5,
+        serverSelectionTimeoutMS=5000,
+    )
+
+
 async def init_mongo() -> AsyncIOMotorDatabase:
     """
     Initialize the MongoDB connection exactly once (idempotent).
     Safe to call multiple times concurrently.
+    Fast path returns the live DB without touching the lock.
     """
     global _mongo_client, _mongo_db
 
+    if _mongo_db is not None:
+        return _mongo_db
+
     async with _lock:
         if _mongo_db is not None:
             return _mongo_db
@@ -29,9 +49,10 @@ async def init_mongo() -> AsyncIOMotorDatabase:
                 host_part = settings.MONGO_URI.split("@")[-1]
             except Exception:
                 host_part = "<hidden>"
-            print(f"🧩 Connecting to MongoDB: {host_part}")
+            logger.info("🧩 Connecting to MongoDB: %s", host_part)
 
-            client = AsyncIOMotorClient(settings.MONGO_URI)
+            # Reuse a lazily created client (see get_mongo_client) if any
+            client = _mongo_client if _mongo_client is not None else _new_client()
             db = client[settings.MONGO_DB]
 
             # Lightweight connectivity check
@@ -39,10 +60,9 @@ async def init_mongo() -> AsyncIOMotorDatabase:
 
             _mongo_client = client
             _mongo_db = db
-            print("✅ MongoDB connection established successfully.")
+            logger.info("✅ MongoDB connection established successfully.")
         except Exception as e:
-            print(f"❌ MongoDB connection failed: {e}")
-            traceback.print_exc()
+            logger.exception("❌ MongoDB connection failed: %s", e)
             raise
 
     return _mongo_db
@@ -64,7 +84,7 @@ def get_mongo_client() -> AsyncIOMotorDatabase:
     # Provide a non-pinged handle to avoid raising at import-time code paths.
     # This keeps old code working; warmup/route handlers should call init_mongo().
     if _mongo_client is None:
-        _mongo_client = AsyncIOMotorClient(settings.MONGO_URI)
+        _mongo_client = _new_client()
     return _mongo_client[settings.MONGO_DB]
 
 
@@ -78,3 +98,40 @@ def get_collection(name: str) -> AsyncIOMotorCollection:
         raise ValueError("Collection name is required")
     db = get_mongo_client()
     return db[name]
+
+
+# -------------------------------------------------------------
+# 🔎 Weighted $text indexes (hotel / attraction free-text search)
+# -------------------------------------------------------------
+TEXT_INDEXES = {
+    settings.COLL_HOTELS: (
+        "hotels_text",
+        {"hotelName": 10, "cityName": 5, "address": 1},
+    ),
+    settings.COLL_ATTRACTIONS: (
+        "attractions_text",
+        {"name": 10, "cityName": 5, "category": 1},
+    ),
+}
+
+
+async def ensure_text_indexes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Create the weighted $text indexes (idempotent).
+    A collection may only hold one text index, so a conflicting one
+    (IndexOptionsConflict 85 / IndexKeySpecsConflict 86) is dropped and rebuilt.
+    """
+    for coll_name, (index_name, weights) in TEXT_INDEXES.items():
+        coll = db[coll_name]
+        keys = [(field, "text") for field in weights]
+        try:
+            await coll.create_index(keys, weights=weights, name=index_name)
+        except OperationFailure as e:
+            if e.code not in (85, 86):
+                raise
+            info = await coll.index_information()
+            for name, spec in info.items():
+                if any(kind == "text" for _, kind in spec.get("key", [])):
+                    await coll.drop_index(name)
+            await coll.create_index(keys, weights=weights, name=index_name)
+        logger.info("✅ Text index '%s' ready on %s.", index_name, coll_name)
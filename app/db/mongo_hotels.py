@@ -1,15 +1,47 @@
 # app/db/mongo_hotels.py
-from motor.motor_asyncio import AsyncIOMotorClient
 from app.config import settings
+from app.db.mongo import get_collection
+from app.utils.text import city_key, ci_exact
 
-client = AsyncIOMotorClient(settings.MONGO_URI)
-db = client[settings.MONGO_DB]
+# Only the fields the planner reads (pick_hotel / retrievers)
+HOTEL_PROJECTION = {
+    "hotelId": 1, "id": 1, "hotelName": 1, "cityName": 1,
+    "price": 1, "rating": 1, "address": 1,
+}
 
 async def fetch_hotels_from_mongo(city: str, limit: int = 10):
     """
     Fetch hotels directly from MongoDB when Redis doesn't return results.
+    Uses an indexed equality match on `cityName_lc` (see
+    app/db/patch_add_city_keys.py); falls back to the regex scan
+    for documents that have not been patched yet.
     """
-    collection = db[settings.COLL_HOTELS]
-    cursor = collection.find({"cityName": {"$regex": f"^{city}$", "$options": "i"}}).limit(limit)
+    collection = get_collection(settings.COLL_HOTELS)
+    cursor = collection.find({"cityName_lc": city_key(city)}, HOTEL_PROJECTION).limit(limit)
+    hotels = await cursor.to_list(length=limit)
+    if hotels:
+        return hotels
+
+    cursor = collection.find(
+        {"cityName": ci_exact(city), "cityName_lc": {"$exists": False}},
+        HOTEL_PROJECTION,
+    ).limit(limit)
     hotels = await cursor.to_list(length=limit)
     return hotels
+
+
+async def search_hotels_text(q: str, city: str, limit: int = 10):
+    """
+    Ranked free-text hotel search backed by the `hotels_text` index
+    (see ensure_text_indexes), scoped to a city and sorted by textScore.
+    """
+    collection = get_collection(settings.COLL_HOTELS)
+    cursor = (
+        collection.find(
+            {"$text": {"$search": q}, "cityName_lc": city_key(city)},
+            {**HOTEL_PROJECTION, "score": {"$meta": "textScore"}},
+        )
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
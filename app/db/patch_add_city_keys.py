@@ -0,0 +1,64 @@
+import asyncio
+from pymongo import UpdateOne
+from app.config import settings
+from app.db.mongo import get_mongo_client
+from app.utils.text import city_key
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# collection -> city fields that get a normalized `<field>_lc` twin
+CITY_FIELDS = {
+    settings.COLL_HOTELS: ["cityName"],
+    settings.COLL_ATTRACTIONS: ["cityName"],
+    settings.COLL_EVENTS: ["cityName"],
+    settings.COLL_FLIGHTS: ["origin", "destination"],
+    settings.COLL_TRANSPORTS: ["cityName", "from_city", "to_city"],
+}
+
+async def backfill_city_keys(collection: AsyncIOMotorCollection, fields) -> int:
+    """
+    Add the normalized `<field>_lc` keys to documents that lack them and ensure
+    their indexes. Idempotent; cheap once every document is patched.
+    Returns the number of documents modified.
+    """
+    coll_name = collection.name
+    modified = 0
+    for field in fields:
+        lc_field = f"{field}_lc"
+
+        # Fetch only documents missing the normalized city key
+        cursor = collection.find(
+            {field: {"$type": "string"}, lc_field: {"$exists": False}},
+            {field: 1},
+        ).batch_size(500)
+
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {lc_field: city_key(doc[field])}})
+            async for doc in cursor
+        ]
+
+        if ops:
+            result = await collection.bulk_write(ops, ordered=False)
+            modified += result.modified_count
+            print(f"✅ Added {lc_field} to {result.modified_count} {coll_name} records.")
+        else:
+            print(f"✅ All {coll_name} records already have {lc_field}.")
+
+        # Equality lookups on the key use this index instead of a regex scan
+        await collection.create_index(lc_field)
+
+    # Flight fallbacks match origin and destination together, cheapest first
+    if {"origin", "destination"} <= set(fields):
+        await collection.create_index([("origin_lc", 1), ("destination_lc", 1), ("price", 1)])
+    return modified
+
+async def patch_city_keys(coll_name: str, fields):
+    db = get_mongo_client()
+    return await backfill_city_keys(db[coll_name], fields)
+
+async def main():
+    for coll_name, fields in CITY_FIELDS.items():
+        await patch_city_keys(coll_name, fields)
+    print("🎯 Finished patching city keys.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,42 +1,89 @@
+import argparse
 import asyncio
+from typing import Optional
+from bson.binary import Binary
+from pymongo import UpdateOne, WriteConcern
 from app.db.mongo import get_mongo_client
-from app.embeddings.embed_text import embed_text
+from app.embeddings.embed_text import embed_texts
 
-async def patch_transports():
-    db = get_mongo_client()
-    collection = db["transports"]
+BATCH_SIZE = 500
 
-    # Fetch only documents without embeddings
-    cursor = collection.find({"embedding": {"$exists": False}})
-    docs = await cursor.to_list(length=100)
+# Only the fields the embedding text is built from
+TRANSPORT_PROJECTION = {"mode": 1, "provider": 1, "from_city": 1, "to_city": 1, "price": 1}
 
-    if not docs:
-        print("✅ All transport records already have embeddings.")
-        return
 
-    for doc in docs:
-        text = (
-            f"{doc.get('mode', '')} {doc.get('provider', '')} "
-            f"from {doc.get('from_city', '')} to {doc.get('to_city', '')} "
-            f"price {doc.get('price', '')} SAR"
-        )
+async def _flush(collection, docs, acknowledged: bool = True) -> Optional[int]:
+    """
+    Embed one batch of docs and write it back in a single bulk round-trip.
+    Returns the modified count, or None for an unacknowledged (w=0) write.
+    """
+    texts = [
+        f"{doc.get('mode', '')} {doc.get('provider', '')} "
+        f"from {doc.get('from_city', '')} to {doc.get('to_city', '')} "
+        f"price {doc.get('price', '')} SAR"
+        for doc in docs
+    ]
+    embeddings = embed_texts(texts)  # (N, dim) float32
 
-        # Generate embedding
-        embedding = embed_text(text)
+    # Raw float32 bytes as BSON Binary: half the size of a list of doubles
+    ops = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": Binary(embeddings[i].tobytes())}})
+        for i, doc in enumerate(docs)
+    ]
+    if not acknowledged:
+        # The result carries no counts: nothing is known about these writes
+        await collection.with_options(write_concern=WriteConcern(w=0)).bulk_write(ops, ordered=False)
+        return None
 
-        # ✅ Convert NumPy array to list before saving
-        if hasattr(embedding, "tolist"):
-            embedding = embedding.tolist()
+    result = await collection.bulk_write(ops, ordered=False)
+    return result.modified_count
 
-        # Update MongoDB document
-        await collection.update_one(
-            {"_id": doc["_id"]},
-            {"$set": {"embedding": embedding}}
-        )
 
-        print(f"✅ Added embedding for transport: {doc.get('id')} ({doc.get('mode')})")
+async def patch_transports(unacknowledged: bool = False):
+    """
+    Backfill transport embeddings. `unacknowledged` (opt-in, re-runnable
+    backfills only) sends every batch but the last with w=0; the last one is
+    acknowledged before the remaining docs are counted. That count is a hint,
+    not a confirmation: earlier w=0 writes may still be in flight or lost.
+    """
+    db = get_mongo_client()
+    collection = db["transports"]
+
+    # Stream documents without embeddings; memory stays bounded by 2×BATCH_SIZE
+    cursor = collection.find(
+        {"embedding": {"$exists": False}}, TRANSPORT_PROJECTION
+    ).batch_size(BATCH_SIZE)
+
+    # One batch is always held back, so the final write can be acknowledged
+    patched, sent, buf = 0, 0, []
+    async for doc in cursor:
+        buf.append(doc)
+        if len(buf) > BATCH_SIZE:
+            batch, buf = buf[:BATCH_SIZE], buf[BATCH_SIZE:]
+            modified = await _flush(collection, batch, acknowledged=not unacknowledged)
+            sent += len(batch)
+            patched += modified or 0
+    if buf:
+        patched += await _flush(collection, buf)
+        sent += len(buf)
+
+    if not sent:
+        print("✅ All transport records already have embeddings.")
+        return
 
+    if not unacknowledged:
+        print(f"✅ Added embeddings for {patched} transport records.")
+    else:
+        print(f"📤 Sent embeddings for {sent} transport records (all but the last batch unacknowledged).")
+        missing = await collection.count_documents({"embedding": {"$exists": False}})
+        if missing:
+            print(f"⚠️ {missing} transport records still lack embeddings — re-run the patch.")
     print("🎯 Finished patching transport embeddings.")
 
 if __name__ == "__main__":
-    asyncio.run(patch_transports())
+    parser = argparse.ArgumentParser(description="Backfill transport embeddings.")
+    parser.add_argument(
+        "--unacknowledged", action="store_true",
+        help="send writes with w=0 (faster, no per-write confirmation; safe to re-run)",
+    )
+    asyncio.run(patch_transports(unacknowledged=parser.parse_args().unacknowledged))
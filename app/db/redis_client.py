@@ -1,4 +1,69 @@
+import asyncio
+import os
+import socket
+from urllib.parse import urlparse
+import redis
 import redis.asyncio as aioredis
 from app.config import settings
 
-redis_async = aioredis.from_url(settings.REDIS_URL, decode_responses=False)
+# One shared connection pool for every async Redis caller in the process.
+# Blocking: with REDIS_ASYNC_POOL_SIZE connections busy, callers await a free
+# one (up to 5s) instead of failing with "Too many connections".
+pool = aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_ASYNC_POOL_SIZE,
+    timeout=5,
+    decode_responses=False,
+)
+redis_async = aioredis.Redis(connection_pool=pool)
+
+
+# ------------------------------------------------------------
+# 🔌 Sync pool (RediSearch queries, cache writes, vector sync)
+# ------------------------------------------------------------
+def _sync_pool() -> redis.BlockingConnectionPool:
+    """
+    Blocking pool: once REDIS_POOL_SIZE connections are in flight, callers
+    wait up to 5s for a free one, they don't open more.
+    A colocated Redis is reached over its UNIX socket; TCP gets keepalive
+    (redis-py already sets TCP_NODELAY on its TCP sockets).
+    """
+    url = urlparse(settings.REDIS_URL)
+    if (
+        url.scheme == "redis"
+        and url.hostname in ("localhost", "127.0.0.1")
+        and not url.password
+        and os.path.exists(settings.REDIS_UNIX_SOCKET)
+    ):
+        db = (url.path or "/0").lstrip("/") or "0"
+        return redis.BlockingConnectionPool.from_url(
+            f"unix://{settings.REDIS_UNIX_SOCKET}?db={db}",
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=5,
+        )
+
+    keepalive_opts = {socket.TCP_KEEPIDLE: 30} if hasattr(socket, "TCP_KEEPIDLE") else {}
+    return redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_POOL_SIZE,
+        timeout=5,
+        socket_keepalive=True,
+        socket_keepalive_options=keepalive_opts,
+    )
+
+
+sync_pool = _sync_pool()
+redis_sync = redis.Redis(connection_pool=sync_pool)
+
+
+async def warm_redis_pools(connections: int = settings.REDIS_WARM_CONNECTIONS) -> None:
+    """
+    Open `connections` sockets in each pool ahead of the first requests:
+    concurrent PINGs each check out (and so create) their own connection.
+    The sync pings also spin up the worker threads searches run on.
+    """
+    connections = max(0, min(connections, settings.REDIS_ASYNC_POOL_SIZE, settings.REDIS_POOL_SIZE))
+    await asyncio.gather(
+        *(redis_async.ping() for _ in range(connections)),
+        *(asyncio.to_thread(redis_sync.ping) for _ in range(connections)),
+    )
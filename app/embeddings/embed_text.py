@@ -1,9 +1,52 @@
+import os
+from functools import lru_cache
+from typing import List
 import numpy as np
 
+EMBED_DIM = 1536
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "8192"))
+
+
+def _rng_for(text: str) -> np.random.Generator:
+    # Private PCG64 stream per text: no global RNG state is touched.
+    return np.random.Generator(np.random.PCG64(abs(hash(text)) % (2**32)))
+
+
+@lru_cache(maxsize=EMBED_CACHE_SIZE)
+def _embed_cached(text: str) -> bytes:
+    # Cache immutable bytes so callers can never mutate a cached vector.
+    return _rng_for(text).random(EMBED_DIM, dtype=np.float32).tobytes()
+
+
 # TEMP stub until we integrate real OpenAI / HuggingFace embeddings
 # Each call returns a deterministic small random vector for testing.
+# Contract: always a contiguous float32 ndarray, so .tobytes() is a plain memcpy.
 def embed_text(text: str) -> np.ndarray:
-    if not text:
-        text = "empty"
-    np.random.seed(abs(hash(text)) % (2**32))  # deterministic for same text
-    return np.random.rand(1536).astype(np.float32)
+    return np.frombuffer(_embed_cached(text or "empty"), dtype=np.float32).copy()
+
+
+def embed_text_bytes(text: str) -> bytes:
+    """
+    Cached float32 bytes of embed_text(text), ready to send as a Redis
+    vector param without building (or copying) an ndarray.
+    """
+    return _embed_cached(text or "empty")
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Batch variant of embed_text: returns an (N, EMBED_DIM) float32 matrix.
+    Rows match embed_text(texts[i]); the output is allocated once up front.
+    """
+    out = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        out[i] = np.frombuffer(_embed_cached(text or "empty"), dtype=np.float32)
+    return out
+
+
+def embed_text_batch(texts: List[str]) -> List[bytes]:
+    """
+    Float32 bytes for several texts in one call (one model pass once a real
+    embedder is plugged in); element i equals embed_text_bytes(texts[i]).
+    """
+    return [_embed_cached(text or "empty") for text in texts]
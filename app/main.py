@@ -1,23 +1,33 @@
 # -------------------------------------------------------------
 # Travel AI Backend — FastAPI Entrypoint (Cloud Run Ready)
 # -------------------------------------------------------------
+# uvloop (libuv event loop) where available; uvicorn's loop="auto"
+# also picks it up once installed. Not supported on Windows.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 from fastapi import FastAPI, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 # Routers
 from app.api.itinerary_router import router as itinerary_router
 
 # Mongo init
-from app.db.mongo import get_mongo_client, init_mongo
+from app.db.mongo import get_mongo_client, init_mongo, ensure_text_indexes
 
 # Redis index management
 from app.redis_index import ensure_all_indexes
+from app.db.redis_client import redis_async, warm_redis_pools
+from app.rag.retrievers import FALLBACK_PROJECTIONS, get_collection_safe
 
 # Embeddings / vector utilities
 from app.rag.utils.vector_initilizer import ensure_embeddings_for_collection
 
 from app.config import settings
-import redis
 import asyncio
 import traceback
 
@@ -29,6 +39,7 @@ app = FastAPI(
     title="Travel AI Backend",
     description="FastAPI backend for ZTraveler / Hala Saudi PMS-AI",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Allow all origins (relax later for production)
@@ -83,10 +94,8 @@ async def initialize_services():
         # -------------------------------------------------
         # Connect to Redis
         # -------------------------------------------------
-        r = None
         try:
-            r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
-            r.ping()
+            await redis_async.ping()
             print("Connected to Redis.")
         except Exception as re:
             print(f"Redis connection failed: {re}")
@@ -96,8 +105,9 @@ async def initialize_services():
         # -------------------------------------------------
         # Create RediSearch vector indexes
         # -------------------------------------------------
+        # Runs on the shared async pool while Mongo connects.
         print("Ensuring Redis indexes exist...")
-        ensure_all_indexes(r)
+        redis_indexes = asyncio.create_task(ensure_all_indexes(redis_async))
 
         # -------------------------------------------------
         # MongoDB connection
@@ -110,13 +120,35 @@ async def initialize_services():
         except Exception as me:
             print(f"MongoDB initialization failed: {me}")
             traceback.print_exc()
+            await redis_indexes
             return
 
         # -------------------------------------------------
-        # Ensure embeddings for all Mongo collections
+        # Mongo $text indexes + embeddings for all collections
         # -------------------------------------------------
+        async def _text_indexes():
+            try:
+                await ensure_text_indexes(db)
+            except Exception as te:
+                print(f"Text index creation failed: {te}")
+
+        # Pre-open the pools and cache the retriever collection handles, so
+        # the first itinerary requests don't pay connection handshakes
+        async def _warm_pools():
+            try:
+                await asyncio.gather(
+                    warm_redis_pools(),
+                    *(get_collection_safe(name) for name in FALLBACK_PROJECTIONS),
+                )
+                print("Connection pools warmed.")
+            except Exception as we:
+                print(f"Connection pool warmup failed: {we}")
+
         print("Ensuring MongoDB embeddings...")
         await asyncio.gather(
+            redis_indexes,
+            _text_indexes(),
+            _warm_pools(),
             ensure_embeddings_for_collection(db["hotels"], "idx:hotels", "hotel", "embedding", 384),
             ensure_embeddings_for_collection(db["attractions"], "idx:attractions", "attr", "embedding", 384),
             ensure_embeddings_for_collection(db["events"], "idx:events", "event", "embedding", 384),
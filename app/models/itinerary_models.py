@@ -1,7 +1,7 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
-import uuid
+import secrets
 
 
 # ------------------------------------------------------------
@@ -95,7 +95,7 @@ class TripCost(BaseModel):
 #  Full AI Itinerary Response
 # ------------------------------------------------------------
 class Itinerary(BaseModel):
-    trip_id: str = f"TRIP-{uuid.uuid4().hex[:8].upper()}"
+    trip_id: str = Field(default_factory=lambda: f"TRIP-{secrets.token_hex(4).upper()}")
     summary_text: str
     highlights: List[str]
     days: List[DayPlan]
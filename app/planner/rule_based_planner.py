@@ -1,10 +1,31 @@
 from typing import List, Dict, Any, Set, Optional
+import heapq
+import zlib
 from app.models.itinerary_models import Hotel, Activity, DayPlan
 
 
+# NOTE: the planner only builds models from retriever output it has
+# already coerced (floats / strings), so it uses `model_construct` to
+# skip per-field validation. User input (TravelerPrefs) stays validated.
+def _str_or_none(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
 # -------------------------------------------------------------------
 # 🏨 Hotel Selector
 # -------------------------------------------------------------------
+def _to_hotel(h: Dict[str, Any]) -> Hotel:
+    return Hotel.model_construct(
+        id=_str_or_none(h.get("hotelId") or h.get("id")),
+        name=h.get("hotelName"),
+        city=h.get("cityName"),
+        price_per_night=float(h.get("price", 0)),
+        rating=float(h.get("rating", 0)),
+        address=h.get("address"),
+        source=h.get("source", "mongo"),
+    )
+
+
 def pick_hotel(hotels: List[Dict[str, Any]], nights: int, hotel_budget: float) -> Optional[Hotel]:
     """
     Selects the best-rated hotel within budget.
@@ -13,35 +34,19 @@ def pick_hotel(hotels: List[Dict[str, Any]], nights: int, hotel_budget: float) -
     if not hotels:
         return None
 
-    # Sort by rating (desc) then price (asc)
-    hotels_sorted = sorted(
-        hotels, key=lambda h: (-h.get("rating", 0), h.get("price", 999999))
-    )
-
-    # Try to find one within the budget
-    for h in hotels_sorted:
+    # Single pass: best (rating desc, price asc) within budget + cheapest overall
+    best_fit, best_fit_key = None, None
+    cheapest, cheapest_price = None, float("inf")
+    for h in hotels:
         if h.get("price", 0) * nights <= hotel_budget:
-            return Hotel(
-                id=h.get("hotelId") or h.get("id"),
-                name=h.get("hotelName"),
-                city=h.get("cityName"),
-                price_per_night=float(h.get("price", 0)),
-                rating=float(h.get("rating", 0)),
-                address=h.get("address"),
-                source=h.get("source", "mongo"),
-            )
+            key = (-h.get("rating", 0), h.get("price", 999999))
+            if best_fit_key is None or key < best_fit_key:
+                best_fit, best_fit_key = h, key
+        price = h.get("price", float("inf"))
+        if cheapest is None or price < cheapest_price:
+            cheapest, cheapest_price = h, price
 
-    # Fallback → cheapest available
-    cheapest = min(hotels_sorted, key=lambda h: h.get("price", float("inf")))
-    return Hotel(
-        id=cheapest.get("hotelId") or cheapest.get("id"),
-        name=cheapest.get("hotelName"),
-        city=cheapest.get("cityName"),
-        price_per_night=float(cheapest.get("price", 0)),
-        rating=float(cheapest.get("rating", 0)),
-        address=cheapest.get("address"),
-        source=cheapest.get("source", "mongo"),
-    )
+    return _to_hotel(best_fit if best_fit is not None else cheapest)
 
 
 # -------------------------------------------------------------------
@@ -58,22 +63,25 @@ def pick_activities(
     Selects activities within budget with diversity and uniqueness.
     - Avoids repeating IDs across days
     - Balances by category
-    - Deterministic daily variety via random seeding
+    - Deterministic daily variety via a per-day tie-breaker
     """
-    import random
-
     if not attractions:
         return []
 
     used_ids = used_ids or set()
-    remaining = [a for a in attractions if a.get("id") not in used_ids]
-
-    # Deterministic shuffle for stable variety
-    random.seed(day_number)
-    random.shuffle(remaining)
 
-    # Prioritize high rating + low entry fee
-    remaining.sort(key=lambda a: (-a.get("rating", 0), a.get("entry_fee", 0)))
+    # Prioritize high rating + low entry fee; ties are broken by a stable
+    # per-(id, day) hash instead of shuffling + re-sorting the whole list.
+    def _rank(a: Dict[str, Any]):
+        tie = zlib.crc32(f"{a.get('id')}:{day_number}".encode())
+        return (-a.get("rating", 0), a.get("entry_fee", 0), tie)
+
+    # Over-fetch a few candidates per slot to survive budget/category filters
+    remaining = heapq.nsmallest(
+        slots * 4,
+        (a for a in attractions if a.get("id") not in used_ids),
+        key=_rank,
+    )
 
     picked: List[Activity] = []
     total_spent = 0.0
@@ -92,8 +100,8 @@ def pick_activities(
             continue
 
         picked.append(
-            Activity(
-                id=aid,
+            Activity.model_construct(
+                id=_str_or_none(aid),
                 name=a.get("name"),
                 city=a.get("cityName"),
                 category=category,
@@ -133,7 +141,7 @@ def build_day(
     if day_index == 1 and hotel:
         estimated_cost += hotel.price_per_night
 
-    return DayPlan(
+    return DayPlan.model_construct(
         day_index=day_index,
         city=city,
         hotel=hotel if day_index == 1 else None,
@@ -1,15 +1,73 @@
 import os
-import re
+import hashlib
 import json
+import math
+import re
+import threading
+import time
+import httpx
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
+from google.api_core import exceptions as google_exceptions
+from tenacity import Retrying, stop_after_attempt, wait_exponential_jitter, retry_if_exception
   # ✅ updated import
 from .itinerary_prompt import itinerary_prompt
+from app.config import settings
+from app.embeddings.embed_text import embed_text_bytes
+from app.utils.text import city_key
+from app.rag.redis_vectorstores import r_sync, _knn_query
+from app.redis_index import IDX_ITINERARY_CACHE, EMB_ITINERARY_CACHE, PREFIX_MAP, to_index_vector
+
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+    _JSON_ERRORS: Tuple[type, ...] = (orjson.JSONDecodeError, json.JSONDecodeError)
+except ImportError:  # stdlib fallback when orjson is not installed
+    _loads, _dumps = json.loads, json.dumps
+    _JSON_ERRORS = (json.JSONDecodeError,)
 
 
 # ------------------------------------------------------------
 # 🧩 Helper: safely extract JSON from model output
 # ------------------------------------------------------------
+_JSON_SPECIALS = re.compile(r'[{}"\\]')
+
+
+def _find_json_span(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Locate the first balanced {...} object in a single linear pass.
+    Braces inside string literals (including escaped quotes) are ignored,
+    so there is no regex backtracking on long model outputs. Only the
+    structural characters are visited; plain text is skipped in C.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth, in_str, skip_to = 0, False, -1
+    for m in _JSON_SPECIALS.finditer(text, start):
+        i = m.start()
+        if i < skip_to:
+            continue  # character escaped by a preceding backslash
+        c = text[i]
+        if in_str:
+            if c == "\\":
+                skip_to = i + 2
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return None
+
+
 def _extract_json_block(text: str) -> dict:
     """
     Extract and safely parse the first JSON object in a text response.
@@ -18,20 +76,189 @@ def _extract_json_block(text: str) -> dict:
     if not text:
         return {}
 
-    match = re.search(r"\{[\s\S]*\}", text)
-    if not match:
+    # Fast path: well-formed output is the bare object, no scan needed
+    if text.lstrip().startswith("{"):
+        try:
+            return _loads(text)
+        except _JSON_ERRORS:
+            pass
+
+    span = _find_json_span(text)
+    if not span:
         print("⚠️ No JSON block found in model output. First 400 chars:\n", text[:400])
         return {}
 
-    json_text = match.group(0)
+    json_text = text[span[0]:span[1]]
     try:
-        return json.loads(json_text)
-    except json.JSONDecodeError as e:
+        return _loads(json_text)
+    except _JSON_ERRORS as e:
         print("⚠️ JSON decoding failed:", e)
         print("Raw JSON snippet (first 400 chars):\n", json_text[:400])
         return {}
 
 
+# ------------------------------------------------------------
+# 🤖 Cached Gemini models + chain (built once, reused per call)
+# ------------------------------------------------------------
+PRIMARY_MODEL = "gemini-flash-latest"
+FALLBACK_MODEL = "gemini-pro-latest"
+
+_MODEL_LOCK = threading.Lock()
+_MODELS: Dict[Tuple[str, str], ChatGoogleGenerativeAI] = {}
+_CHAINS: Dict[str, Any] = {}
+
+
+def _get_model(name: str, google_api_key: str) -> ChatGoogleGenerativeAI:
+    """One client (and its HTTP connection pool) per (model, API key)."""
+    key = (name, google_api_key)
+    model = _MODELS.get(key)
+    if model is None:
+        with _MODEL_LOCK:
+            model = _MODELS.get(key)
+            if model is None:
+                model = ChatGoogleGenerativeAI(
+                    model=name,
+                    temperature=0.6,
+                    google_api_key=google_api_key,
+                    api_base="https://generativelanguage.googleapis.com/v1",
+                    timeout=settings.LLM_TIMEOUT,
+                    max_output_tokens=settings.LLM_MAX_OUTPUT_TOKENS,
+                    # Retries live in _invoke_with_retry; one layer only
+                    max_retries=1,
+                )
+                _MODELS[key] = model
+    return model
+
+
+def _get_chain(google_api_key: str):
+    """
+    prompt | flash (falls back to pro on call-time errors) | str parser.
+    """
+    chain = _CHAINS.get(google_api_key)
+    if chain is None:
+        primary = _get_model(PRIMARY_MODEL, google_api_key)
+        fallback = _get_model(FALLBACK_MODEL, google_api_key)
+        chain = _CHAINS.setdefault(
+            google_api_key,
+            itinerary_prompt | primary.with_fallbacks([fallback]) | StrOutputParser(),
+        )
+    return chain
+
+
+# ------------------------------------------------------------
+# 🔁 Bounded retries for transient Gemini failures
+# ------------------------------------------------------------
+RETRY_STATUS = {429, 500, 502, 503, 504, 529}
+_TRANSIENT_GOOGLE = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUS
+    return isinstance(exc, (TimeoutError, httpx.TimeoutException, *_TRANSIENT_GOOGLE))
+
+
+def _invoke_with_retry(chain, input_data: dict) -> str:
+    """
+    chain.invoke with exponential backoff + jitter on 429/5xx/timeouts.
+    Logs attempt count and latency for every call.
+    """
+    t0 = time.perf_counter()
+    attempt = 0
+    try:
+        for attempt_state in Retrying(
+            stop=stop_after_attempt(settings.LLM_MAX_ATTEMPTS),
+            wait=wait_exponential_jitter(initial=1, max=30),
+            retry=retry_if_exception(_is_transient),
+            reraise=True,
+        ):
+            with attempt_state:
+                attempt = attempt_state.retry_state.attempt_number
+                result = chain.invoke(input_data)
+    except Exception:
+        print(f"⏱️ Gemini call failed after {attempt} attempt(s) in {time.perf_counter() - t0:.2f}s")
+        raise
+    print(f"⏱️ Gemini call ok: {attempt} attempt(s) in {time.perf_counter() - t0:.2f}s")
+    return result
+
+
+# ------------------------------------------------------------
+# 🧠 Semantic cache (Redis HNSW) in front of the LLM call
+# ------------------------------------------------------------
+# RediSearch COSINE scores are distances (1 - similarity); a hit needs
+# similarity >= 0.92.
+CACHE_MIN_SIMILARITY = 0.92
+# Budgets within one band (a ~25% step) count as the same budget
+CACHE_BUDGET_BAND_RATIO = 1.25
+
+_NON_TAG_CHARS = re.compile(r"\W+")
+
+
+def _cache_scope(destination: str, start_date: str, end_date: str, budget_total: float) -> Dict[str, Any]:
+    """
+    Exact-match fields stored next to each cached narrative. Similar embeddings
+    are not enough: a 3-day and a 4-day trip (or 2k vs 8k budget) read alike
+    but need different narratives.
+    """
+    try:
+        days = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1
+    except (TypeError, ValueError):
+        days = 0
+    budget = float(budget_total or 0)
+    band = math.floor(math.log(budget, CACHE_BUDGET_BAND_RATIO)) if budget >= 1 else 0
+    # Word characters only, so the tag needs no escaping ("Riyadh, Jeddah" -> "riyadh_jeddah")
+    city = _NON_TAG_CHARS.sub("_", city_key(destination)).strip("_") or "_"
+    return {"city": city, "days": days, "budget_band": band}
+
+
+def _cache_lookup(query_vec: bytes, scope: Dict[str, Any]) -> Optional[dict]:
+    """Return the cached narrative of the nearest prior request in the same scope, if close enough."""
+    where = (
+        f"@city:{{{scope['city']}}} "
+        f"@days:[{scope['days']} {scope['days']}] "
+        f"@budget_band:[{scope['budget_band']} {scope['budget_band']}]"
+    )
+    hits = _knn_query(
+        IDX_ITINERARY_CACHE, EMB_ITINERARY_CACHE, query_vec, 1,
+        filter_str=where,
+        return_fields=["response"],
+    )
+    if not hits:
+        return None
+    try:
+        if 1.0 - float(hits[0].get("score", 1.0)) < CACHE_MIN_SIMILARITY:
+            return None
+        return _loads(hits[0]["response"])
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable itinerary cache entry: {e}")
+        return None
+
+
+def _cache_store(canonical: str, query_vec: bytes, scope: Dict[str, Any], parsed: dict) -> None:
+    key = f"{PREFIX_MAP[IDX_ITINERARY_CACHE]}{hashlib.sha1(canonical.encode()).hexdigest()}"
+    try:
+        pipe = r_sync.pipeline(transaction=False)
+        pipe.hset(key, mapping={
+            EMB_ITINERARY_CACHE: to_index_vector(query_vec),
+            "response": _dumps(parsed),
+            "city": scope["city"],
+            "days": scope["days"],
+            "budget_band": scope["budget_band"],
+        })
+        pipe.expire(key, settings.CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Itinerary cache write failed: {e}")
+
+
 # ------------------------------------------------------------
 # 🚀 Main Function: Generate itinerary narrative (Gemini Flash + Pro Fallback)
 # ------------------------------------------------------------
@@ -60,27 +287,19 @@ def generate_ai_itinerary_narrative(
             "ai_commentary": "Set GOOGLE_API_KEY in environment variables.",
         }
 
-    # Step 1️⃣: Try Gemini Flash model
-    try:
-        model = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest",
-            temperature=0.6,
-            google_api_key=google_api_key,
-            api_base="https://generativelanguage.googleapis.com/v1",
-            convert_system_message_to_human=True,
-        )
-    except Exception as e:
-        print(f"[⚠️ Fallback] gemini-flash-latest failed: {e}")
-        model = ChatGoogleGenerativeAI(
-            model="gemini-pro-latest",
-            temperature=0.6,
-            google_api_key=google_api_key,
-            api_base="https://generativelanguage.googleapis.com/v1",
-            convert_system_message_to_human=True,
-        )
+    # Step 0️⃣: Semantic cache lookup (skips the model on repeated requests)
+    canonical = "|".join([
+        str(origin), str(destination), str(start_date), str(end_date),
+        str(traveler_type), str(budget_total), ",".join(sorted(interests or [])),
+    ])
+    query_vec = embed_text_bytes(canonical)
+    scope = _cache_scope(destination, start_date, end_date, budget_total)
+    cached = _cache_lookup(query_vec, scope)
+    if cached:
+        return cached
 
-    # Step 2️⃣: Build LangChain pipeline
-    chain = itinerary_prompt | model | StrOutputParser()
+    # Step 1️⃣ + 2️⃣: Reuse the cached LangChain pipeline
+    chain = _get_chain(google_api_key)
 
     # Step 3️⃣: Input preparation
     input_data = {
@@ -96,7 +315,7 @@ def generate_ai_itinerary_narrative(
 
     # Step 4️⃣: Execute and handle response
     try:
-        result = chain.invoke(input_data)
+        result = _invoke_with_retry(chain, input_data)
         parsed = _extract_json_block(result)
 
         if not parsed:
@@ -106,6 +325,7 @@ def generate_ai_itinerary_narrative(
                 "ai_commentary": result[:800] if result else "Empty response.",
             }
 
+        _cache_store(canonical, query_vec, scope, parsed)
         return parsed
 
     except Exception as e:
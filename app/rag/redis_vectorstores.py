@@ -1,11 +1,14 @@
-from typing import List, Dict, Any, Optional, Union
+import asyncio
+from array import array
+from typing import Callable, List, Dict, Any, NamedTuple, Optional, Sequence, Tuple, Union
 import numpy as np
-import redis
-import re
 from redis.commands.search.query import Query
-from app.config import settings
-from app.embeddings.embed_text import embed_text
+from redis.commands.search.result import Result
+from app.db.redis_client import redis_async, redis_sync
+from app.embeddings.embed_text import embed_text_bytes, embed_text_batch
 from app.redis_index import (
+    PREFIX_MAP,
+    to_index_vector,
     IDX_HOTELS, EMB_HOTEL,
     IDX_ATTRACTIONS, EMB_ATTR,
     IDX_EVENTS, EMB_EVENT,
@@ -14,15 +17,16 @@ from app.redis_index import (
 )
 
 # ------------------------------------------------------------
-# 🔌 Redis connection
+# 🔌 Redis connection (sync; async callers use the shared redis_async pool)
 # ------------------------------------------------------------
-r_sync = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
+r_sync = redis_sync
 
 
 # ------------------------------------------------------------
 # 🧹 Utilities
 # ------------------------------------------------------------
-REDIS_TAG_ESCAPE = re.compile(r"[,.<>{}\[\]\"'\\:;!@#$%^&*()\-=\+~|/ ]")  # includes space
+# Every TAG special (including space) maps to an escaped space; one C-level pass
+_TAG_ESCAPE_TABLE = str.maketrans({c: "\\ " for c in ",.<>{}[]\"'\\:;!@#$%^&*()-=+~|/ "})
 
 def escape_tag(value: str) -> str:
     """
@@ -32,16 +36,19 @@ def escape_tag(value: str) -> str:
     if not value:
         return ""
     # Replace any disallowed char (including space) with escaped space
-    return REDIS_TAG_ESCAPE.sub(r"\\ ", value.strip())
+    return value.strip().translate(_TAG_ESCAPE_TABLE)
 
-def to_float32_bytes(vec: Union[np.ndarray, List[float]]) -> bytes:
+def to_float32_bytes(vec: Union[bytes, np.ndarray, List[float]]) -> bytes:
+    if isinstance(vec, bytes):
+        return vec  # already serialized (e.g. embed_text_bytes)
     if isinstance(vec, np.ndarray):
-        arr = vec
-    else:
-        arr = np.array(vec, dtype=np.float32)
-    if arr.dtype != np.float32:
-        arr = arr.astype(np.float32)
-    return arr.tobytes()
+        if vec.dtype != np.float32:
+            vec = vec.astype(np.float32, copy=False)
+        return vec.tobytes()
+    # Plain list of floats: array('f') packs straight to C floats (native
+    # byte order, as numpy) without numpy's generic sequence conversion
+    return array("f", vec).tobytes()
+
 
 def decode_bytes(val: Any) -> Any:
     if isinstance(val, (bytes, bytearray)):
@@ -63,177 +70,612 @@ def coerce_numeric(payload: Dict[str, Any], keys: List[str]):
 # ------------------------------------------------------------
 # 🧠 Core KNN query helper (DIALECT 2)
 # ------------------------------------------------------------
-def _knn_query(
-    index: str,
+DEFAULT_RETURN_FIELDS: Tuple[str, ...] = (
+    "id", "name", "cityName", "price", "rating",
+    "category", "entry_fee", "description", "type", "date",
+)
+# First-pass fields for the hybrid search: everything but the heavy
+# 'description', which is fetched afterwards for the surviving docs only.
+LAZY_FIELD = "description"
+LEAN_RETURN_FIELDS: Tuple[str, ...] = tuple(
+    f for f in DEFAULT_RETURN_FIELDS if f != LAZY_FIELD
+) + ("hotelId",)
+
+# "=>[KNN ...]" suffix per (vector_field, k, ef_runtime), and fully built Query
+# objects per (vector_field, k, ef_runtime, filter, return_fields). Filters are
+# city / route tags, so the key space stays small; the cap only guards against
+# unbounded growth.
+_KNN_SUFFIX: Dict[Tuple[str, int, Optional[int]], str] = {}
+_QUERY_CACHE: Dict[Tuple[str, int, Optional[int], str, Tuple[str, ...]], Query] = {}
+_QUERY_CACHE_MAX = 1024
+
+# Longer exclusion lists are filtered client-side instead of as -@id:{..} clauses
+EXCLUDE_INLINE_MAX = 16
+
+# HNSW search breadth: default max(64, 2*k). Indexes built before the HNSW
+# switch are FLAT and reject EF_RUNTIME; they are remembered and skip it.
+EF_RUNTIME_MIN = 64
+_NO_EF_RUNTIME: set = set()
+
+
+def _ef_runtime(index: str, k: int, ef_runtime: Optional[int] = None) -> Optional[int]:
+    if index in _NO_EF_RUNTIME:
+        return None
+    return ef_runtime or max(EF_RUNTIME_MIN, 2 * k)
+
+
+def _rejects_ef_runtime(index: str, err: Exception) -> bool:
+    """True (and remembered) when `index` refused the EF_RUNTIME attribute."""
+    if "EF_RUNTIME" in str(err) and index not in _NO_EF_RUNTIME:
+        print(f"⚠️ {index} does not accept EF_RUNTIME (FLAT index?); querying without it. Rebuild as HNSW.")
+        _NO_EF_RUNTIME.add(index)
+        return True
+    return False
+
+
+def _knn_suffix(vector_field: str, k: int, ef_runtime: Optional[int] = None) -> str:
+    key = (vector_field, k, ef_runtime)
+    suffix = _KNN_SUFFIX.get(key)
+    if suffix is None:
+        ef = f" EF_RUNTIME {ef_runtime}" if ef_runtime else ""
+        suffix = _KNN_SUFFIX[key] = f"=>[KNN {k} @{vector_field} $BLOB{ef} AS score]"
+    return suffix
+
+
+def _knn_query_cmd(
     vector_field: str,
-    query_vec: np.ndarray,
     k: int,
     filter_str: Optional[str] = None,
-    return_fields: Optional[List[str]] = None,
+    return_fields: Optional[Sequence[str]] = None,
     exclude_ids: Optional[List[str]] = None,
-) -> List[Dict[str, Any]]:
+    ef_runtime: Optional[int] = None,
+) -> Query:
     """
-    Executes a DIALECT 2 KNN query with optional filter and exclusions.
-    NOTE: Exclusions only work if you actually store a field like 'doc_id' or 'id' in your schema.
-    RediSearch's internal document id (key name) is not directly filterable unless stored.
+    Assemble (but do not execute) a DIALECT 2 KNN query, so it can be sent
+    on its own or queued on a pipeline together with other searches.
+    Queries without exclusions are cached and shared; treat the result as read-only.
     """
-    # Prepare vector param
-    vec_bytes = to_float32_bytes(query_vec)
-
     # Base filter
     base_filter = filter_str or "*"
+    if not return_fields:
+        ret = DEFAULT_RETURN_FIELDS
+    elif isinstance(return_fields, tuple):
+        ret = return_fields
+    else:
+        ret = tuple(return_fields)
+
+    cache_key = None
+    if not exclude_ids:
+        cache_key = (vector_field, k, ef_runtime, base_filter, ret)
+        cached = _QUERY_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
 
     # Optional: try exclusion if 'id' is a real indexed field in your schema
     if exclude_ids:
         # This assumes you have a TagField/TextField named 'id'. If not, this clause will be ignored by RediSearch.
         no_ids = " ".join([f"-@id:{{{escape_tag(eid)}}}" for eid in exclude_ids])
-        base_filter = f"({base_filter}) {no_ids}".strip()
+        # Unfiltered: the negations alone (no "(*)" wrapper for Redis to parse)
+        base_filter = no_ids if base_filter == "*" else f"({base_filter}) {no_ids}"
 
     # Compose DIALECT 2 KNN query
     # IMPORTANT: Use PARAMS (query_params) with $BLOB, and set .dialect(2)
-    q_str = f"{base_filter}=>[KNN {k} @{vector_field} $BLOB AS score]"
-    q = Query(q_str).sort_by("score").paging(0, k).dialect(2)
+    q = Query(base_filter + _knn_suffix(vector_field, k, ef_runtime)).sort_by("score").paging(0, k).dialect(2)
+    q.return_fields(*ret, "score")
+    # Names _parse_docs reads back ('id' is the key unless stored as a field)
+    q.result_fields = tuple(dict.fromkeys(("id", *ret, "score")))
+
+    if cache_key is not None and len(_QUERY_CACHE) < _QUERY_CACHE_MAX:
+        _QUERY_CACHE[cache_key] = q
+    return q
+
+
+# Per-field converters applied to decoded string values; other fields stay str
+FIELD_CONVERTERS: Dict[str, Any] = {"price": float, "rating": float, "entry_fee": float}
+_MISSING = object()
+
+
+def _postprocess(d: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Build one payload from a search Document by reading only the requested
+    fields (no __dict__ walk). Fields absent from the hash are left out.
+    """
+    payload: Dict[str, Any] = {}
+    for name in fields:
+        v = getattr(d, name, _MISSING)
+        if v is _MISSING:
+            continue
+        if type(v) is bytes:
+            v = v.decode("utf-8", "ignore")
+        conv = FIELD_CONVERTERS.get(name)
+        if conv is not None and type(v) is str:
+            try:
+                v = conv(v)
+            except ValueError:
+                pass
+        payload[name] = v
+    return payload
+
 
-    # Return fields
-    ret = return_fields or [
-        "id", "name", "cityName", "price", "rating",
-        "category", "entry_fee", "description", "type", "date",
+def _parse_docs(res: Any, fields: Sequence[str]) -> List[Dict[str, Any]]:
+    return [_postprocess(d, fields) for d in getattr(res, "docs", [])]
+
+
+class KnnSearch(NamedTuple):
+    """
+    A prepared (not yet executed) search: run alone or pipelined.
+    vec_bytes is None for plain filtered queries (no KNN, no $BLOB param).
+    """
+    index: str
+    query: Query
+    vec_bytes: Optional[bytes]
+    k: int
+    post_exclude: Optional[frozenset]
+
+
+def _plan_exclusions(
+    k: int,
+    return_fields: Optional[Sequence[str]],
+    exclude_ids: Optional[List[str]],
+) -> Tuple[int, Optional[Sequence[str]], Optional[List[str]], Optional[frozenset]]:
+    """
+    (k_query, return_fields, inline_ids, post_exclude) for a search.
+    Up to EXCLUDE_INLINE_MAX ids go into the query as -@id:{..} clauses;
+    longer lists widen the KNN by len(exclude_ids) and are filtered
+    client-side (see _apply_exclusions), with 'id' returned for the check.
+    """
+    if not exclude_ids or len(exclude_ids) <= EXCLUDE_INLINE_MAX:
+        return k, return_fields, exclude_ids, None
+    ret = tuple(return_fields) if return_fields else DEFAULT_RETURN_FIELDS
+    if "id" not in ret:
+        ret = ("id", *ret)
+    return k + len(exclude_ids), ret, None, frozenset(map(str, exclude_ids))
+
+
+def _apply_exclusions(
+    docs: List[Dict[str, Any]], k: int, post_exclude: Optional[frozenset],
+) -> List[Dict[str, Any]]:
+    if not post_exclude:
+        return docs
+    # Document.id is the Redis key ("attraction:A1"); excluded ids may be
+    # given either as the key or as the stored id ("A1")
+    kept = [
+        d for d in docs
+        if str(d.get("id")) not in post_exclude
+        and str(d.get("id")).split(":", 1)[-1] not in post_exclude
     ]
-    q.return_fields(*ret, "score")
+    return kept[:k]
+
+
+def _plan_knn(
+    index: str,
+    vector_field: str,
+    vec_bytes: bytes,
+    k: int,
+    filter_str: Optional[str] = None,
+    return_fields: Optional[Sequence[str]] = None,
+    exclude_ids: Optional[List[str]] = None,
+    lean: bool = False,
+    ef_runtime: Optional[int] = None,
+) -> KnnSearch:
+    if lean and not return_fields:
+        return_fields = LEAN_RETURN_FIELDS
+    k_query, ret, inline_ids, post_exclude = _plan_exclusions(k, return_fields, exclude_ids)
+    ef = _ef_runtime(index, k_query, ef_runtime)
+    q = _knn_query_cmd(vector_field, k_query, filter_str, ret, inline_ids, ef)
+    return KnnSearch(index, q, vec_bytes, k, post_exclude)
+
+
+def _query_params(search: KnnSearch) -> Optional[Dict[str, bytes]]:
+    return {"BLOB": to_index_vector(search.vec_bytes)} if search.vec_bytes is not None else None
+
 
+def _finish_knn(search: KnnSearch, res: Any) -> List[Dict[str, Any]]:
+    return _apply_exclusions(_parse_docs(res, search.query.result_fields), search.k, search.post_exclude)
+
+
+def _run_knn(plan: Callable[[], KnnSearch]) -> List[Dict[str, Any]]:
+    """
+    Execute one search. `plan` is re-invoked once if the index rejects
+    EF_RUNTIME, so the retry is built without it.
+    """
+    search = plan()
+    try:
+        res = r_sync.ft(search.index).search(search.query, query_params=_query_params(search))
+    except Exception as e:
+        if _rejects_ef_runtime(search.index, e):
+            return _run_knn(plan)
+        print(f"[Redis Search Error] {e} | Query: {search.query.query_string()}")
+        return []
+    return _finish_knn(search, res)
+
+
+async def _arun_knn(plan: Callable[[], KnnSearch]) -> List[Dict[str, Any]]:
+    search = plan()
     try:
-        res = r_sync.ft(index).search(q, query_params={"BLOB": vec_bytes})
+        res = await redis_async.ft(search.index).search(search.query, query_params=_query_params(search))
     except Exception as e:
-        print(f"[Redis Search Error] {e} | Query: {q_str}")
+        if _rejects_ef_runtime(search.index, e):
+            return await _arun_knn(plan)
+        print(f"[Redis Search Error] {e} | Query: {search.query.query_string()}")
         return []
+    return _finish_knn(search, res)
+
+
+def _knn_query(
+    index: str,
+    vector_field: str,
+    vec_bytes: bytes,
+    k: int,
+    filter_str: Optional[str] = None,
+    return_fields: Optional[Sequence[str]] = None,
+    exclude_ids: Optional[List[str]] = None,
+    lean: bool = False,
+    ef_runtime: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Executes a DIALECT 2 KNN query with optional filter and exclusions.
+    NOTE: Exclusions only work if you actually store a field like 'doc_id' or 'id' in your schema.
+    RediSearch's internal document id (key name) is not directly filterable unless stored.
+    Fast path: `vec_bytes` must already be float32 bytes (see embed_text_bytes;
+    use to_float32_bytes() for an ndarray / list).
+    lean=True (without explicit return_fields) skips 'description'.
+    ef_runtime trades latency for recall on HNSW indexes (default max(64, 2*k));
+    pass e.g. k*4 for larger-K recall-sensitive searches.
+    """
+    return _run_knn(lambda: _plan_knn(
+        index, vector_field, vec_bytes, k, filter_str, return_fields, exclude_ids, lean, ef_runtime,
+    ))
+
+
+async def _aknn_query(
+    index: str,
+    vector_field: str,
+    vec_bytes: bytes,
+    k: int,
+    filter_str: Optional[str] = None,
+    return_fields: Optional[Sequence[str]] = None,
+    exclude_ids: Optional[List[str]] = None,
+    lean: bool = False,
+    ef_runtime: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Async twin of _knn_query on the shared redis_async pool, so several
+    searches can be awaited concurrently on separate connections.
+    """
+    return await _arun_knn(lambda: _plan_knn(
+        index, vector_field, vec_bytes, k, filter_str, return_fields, exclude_ids, lean, ef_runtime,
+    ))
+
+
+def _collect_pipelined(searches: Sequence[KnnSearch], raw: List[Any]) -> List[List[Dict[str, Any]]]:
+    out: List[List[Dict[str, Any]]] = []
+    for search, res in zip(searches, raw):
+        if isinstance(res, Exception):
+            _rejects_ef_runtime(search.index, res)  # next call to this index drops EF_RUNTIME
+            print(f"[Redis Search Error] {res} | Query: {search.query.query_string()}")
+            out.append([])
+            continue
+        # Pipelined FT.SEARCH replies come back unparsed
+        out.append(_finish_knn(search, Result(res, True, duration=0, has_payload=False, with_scores=False)))
+    return out
+
+
+def _search_args(search: KnnSearch) -> List[Any]:
+    """Raw FT.SEARCH arguments for a prepared search (queued on a pipeline as-is)."""
+    args = [search.index, *search.query.get_args()]
+    params = _query_params(search)
+    if params:
+        args += ["PARAMS", 2 * len(params), *(x for kv in params.items() for x in kv)]
+    return args
+
+
+def search_many(searches: Sequence[KnnSearch]) -> List[List[Dict[str, Any]]]:
+    """
+    Run several prepared searches (see plan_* below) in one pipelined
+    round-trip. A failed search yields [] without affecting the others.
+    """
+    if not searches:
+        return []
+    pipe = r_sync.pipeline(transaction=False)
+    for search in searches:
+        pipe.execute_command("FT.SEARCH", *_search_args(search))
+
+    try:
+        raw = pipe.execute(raise_on_error=False)
+    except Exception as e:
+        print(f"[Redis Search Error] {e} | pipelined KNN x{len(searches)}")
+        return [[] for _ in searches]
+    return _collect_pipelined(searches, raw)
+
+
+async def asearch_many(searches: Sequence[KnnSearch]) -> List[List[Dict[str, Any]]]:
+    """search_many on the async pool: one pipelined round-trip, awaited."""
+    if not searches:
+        return []
+    # Raw FT.SEARCH: AsyncSearch.search only recognizes sync pipelines and
+    # raises on a redis.asyncio one; replies are parsed in _collect_pipelined
+    pipe = redis_async.pipeline(transaction=False)
+    for search in searches:
+        pipe.execute_command("FT.SEARCH", *_search_args(search))
+
+    try:
+        raw = await pipe.execute(raise_on_error=False)
+    except Exception as e:
+        print(f"[Redis Search Error] {e} | pipelined KNN x{len(searches)}")
+        return [[] for _ in searches]
+    return _collect_pipelined(searches, raw)
 
-    docs: List[Dict[str, Any]] = []
-    for d in getattr(res, "docs", []):
-        # d.__dict__ contains fields; exclude private attrs
-        payload = {k: v for k, v in d.__dict__.items() if not k.startswith("_")}
-        # Decode bytes fields
-        for k, v in list(payload.items()):
-            payload[k] = decode_bytes(v)
-        # Coerce numeric
-        coerce_numeric(payload, ["price", "rating", "entry_fee"])
-        docs.append(payload)
-    return docs
+
+# ------------------------------------------------------------
+# 📋 Per-search return fields (tuples: used as Query cache keys as-is)
+# ------------------------------------------------------------
+HOTEL_RETURN_FIELDS = ("hotelName", "cityName", "price", "rating", "description")
+ATTRACTION_RETURN_FIELDS = (
+    "id", "name", "cityName", "category", "entry_fee",
+    "opening_hours", "description", "rating",
+)
+EVENT_RETURN_FIELDS = ("id", "name", "cityName", "type", "date", "description")
+FLIGHT_RETURN_FIELDS = ("id", "airline", "origin", "destination", "price", "duration", "duration_minutes")
+TRANSPORT_RETURN_FIELDS = ("id", "mode", "provider", "cityName", "price", "description")
 
 
 # ------------------------------------------------------------
 # 🏨 Hotels
 # ------------------------------------------------------------
-def search_hotels(city: str, max_price: float, k: int = 8) -> List[Dict[str, Any]]:
+def _hotel_prompt(city: str, max_price: float) -> str:
+    return f"best hotels in {city} under {int(max_price)} SAR"
+
+
+def plan_hotels(
+    city: str,
+    max_price: float,
+    k: int = 8,
+    vec_bytes: Optional[bytes] = None,
+) -> KnnSearch:
     safe_city = escape_tag(city)
-    # Build semantic vector
-    qvec = embed_text(f"best hotels in {city} under {int(max_price)} SAR")
+    # Build semantic vector (unless precomputed by prepare_itinerary_vectors)
+    if vec_bytes is None:
+        vec_bytes = embed_text_bytes(_hotel_prompt(city, max_price))
     # Filter by cityName (TAG) and optional price range if indexed numeric
     # If 'price' is NumericField, this works: @price:[0 {max_price}]
     price_clause = f"@price:[0 {max_price}]" if (max_price and max_price > 0) else ""
     where = f"@cityName:{{{safe_city}}} {price_clause}".strip()
 
-    return _knn_query(
+    return _plan_knn(
         index=IDX_HOTELS,
         vector_field=EMB_HOTEL,
-        query_vec=qvec,
+        vec_bytes=vec_bytes,
         k=k,
         filter_str=where if where else "*",
-        return_fields=["hotelName", "cityName", "price", "rating", "description"],
+        return_fields=HOTEL_RETURN_FIELDS,
     )
 
 
+def search_hotels(
+    city: str,
+    max_price: float,
+    k: int = 8,
+    vec_bytes: Optional[bytes] = None,
+) -> List[Dict[str, Any]]:
+    return _run_knn(lambda: plan_hotels(city, max_price, k, vec_bytes))
+
+
 # ------------------------------------------------------------
 # 🏛️ Attractions
 # ------------------------------------------------------------
-def search_attractions(
+def _attraction_prompt(city: str, interests: List[str]) -> str:
+    safe_intent = ", ".join(interests) if interests else "top attractions"
+    return f"{safe_intent} in {city} best tourist spots"
+
+
+def plan_attractions(
     city: str,
     interests: List[str],
     k: int = 12,
     exclude_ids: Optional[List[str]] = None,
-) -> List[Dict[str, Any]]:
+    vec_bytes: Optional[bytes] = None,
+    max_fee: Optional[float] = None,
+) -> KnnSearch:
     safe_city = escape_tag(city)
-    safe_intent = ", ".join(interests) if interests else "top attractions"
-    qvec = embed_text(f"{safe_intent} in {city} best tourist spots")
+    if vec_bytes is None:
+        vec_bytes = embed_text_bytes(_attraction_prompt(city, interests))
     where = f"@cityName:{{{safe_city}}}"
+    # Fee cap as a negated range: attractions without an entry_fee still match
+    if max_fee is not None and max_fee >= 0:
+        where += f" -@entry_fee:[({max_fee} +inf]"
 
-    return _knn_query(
+    return _plan_knn(
         index=IDX_ATTRACTIONS,
         vector_field=EMB_ATTR,
-        query_vec=qvec,
+        vec_bytes=vec_bytes,
         k=k,
         filter_str=where,
-        return_fields=[
-            "id", "name", "cityName", "category", "entry_fee",
-            "opening_hours", "description", "rating",
-        ],
+        return_fields=ATTRACTION_RETURN_FIELDS,
         exclude_ids=exclude_ids,
     )
 
 
+def search_attractions(
+    city: str,
+    interests: List[str],
+    k: int = 12,
+    exclude_ids: Optional[List[str]] = None,
+    vec_bytes: Optional[bytes] = None,
+    max_fee: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    return _run_knn(lambda: plan_attractions(city, interests, k, exclude_ids, vec_bytes, max_fee))
+
+
 # ------------------------------------------------------------
 # 🎭 Events
 # ------------------------------------------------------------
-def search_events(
+def _event_prompt(city: str, start_iso: str, end_iso: str) -> str:
+    return f"events and festivals in {city} between {start_iso} and {end_iso}"
+
+
+def plan_events(
     city: str,
     start_iso: str,
     end_iso: str,
     k: int = 8,
     exclude_ids: Optional[List[str]] = None,
-) -> List[Dict[str, Any]]:
+    vec_bytes: Optional[bytes] = None,
+) -> KnnSearch:
     safe_city = escape_tag(city)
-    qvec = embed_text(f"events and festivals in {city} between {start_iso} and {end_iso}")
+    if vec_bytes is None:
+        vec_bytes = embed_text_bytes(_event_prompt(city, start_iso, end_iso))
     where = f"@cityName:{{{safe_city}}}"
 
-    return _knn_query(
+    return _plan_knn(
         index=IDX_EVENTS,
         vector_field=EMB_EVENT,
-        query_vec=qvec,
+        vec_bytes=vec_bytes,
         k=k,
         filter_str=where,
-        return_fields=["id", "name", "cityName", "type", "date", "description"],
+        return_fields=EVENT_RETURN_FIELDS,
         exclude_ids=exclude_ids,
     )
 
 
+def search_events(
+    city: str,
+    start_iso: str,
+    end_iso: str,
+    k: int = 8,
+    exclude_ids: Optional[List[str]] = None,
+    vec_bytes: Optional[bytes] = None,
+) -> List[Dict[str, Any]]:
+    return _run_knn(lambda: plan_events(city, start_iso, end_iso, k, exclude_ids, vec_bytes))
+
+
 # ------------------------------------------------------------
 # ✈️ Flights
 # ------------------------------------------------------------
-def search_flights(origin: str, destination: str, k: int = 5) -> List[Dict[str, Any]]:
+def _flight_prompt(origin: str, destination: str) -> str:
+    return f"direct flights from {origin} to {destination}"
+
+
+def plan_flights(
+    origin: str,
+    destination: str,
+    k: int = 5,
+    vec_bytes: Optional[bytes] = None,
+) -> KnnSearch:
     safe_origin = escape_tag(origin)
     safe_dest = escape_tag(destination)
-    qvec = embed_text(f"direct flights from {origin} to {destination}")
+    if vec_bytes is None:
+        vec_bytes = embed_text_bytes(_flight_prompt(origin, destination))
     where = f"@origin:{{{safe_origin}}} @destination:{{{safe_dest}}}"
 
     # Note: schema field might be 'duration' (TextField) or 'duration_minutes' (Numeric in Mongo).
     # We'll request both and normalize later.
-    return _knn_query(
+    return _plan_knn(
         index=IDX_FLIGHTS,
         vector_field=EMB_FLIGHT,
-        query_vec=qvec,
+        vec_bytes=vec_bytes,
         k=k,
         filter_str=where,
-        return_fields=["id", "airline", "origin", "destination", "price", "duration", "duration_minutes"],
+        return_fields=FLIGHT_RETURN_FIELDS,
     )
 
 
+def search_flights(
+    origin: str,
+    destination: str,
+    k: int = 5,
+    vec_bytes: Optional[bytes] = None,
+) -> List[Dict[str, Any]]:
+    return _run_knn(lambda: plan_flights(origin, destination, k, vec_bytes))
+
+
+def plan_cheapest_flight(origin: str, destination: str) -> KnnSearch:
+    """
+    Cheapest origin→destination flight: exact tag filter + SORTBY price ASC
+    LIMIT 0 1. No embedding or KNN — callers only ever wanted the min price.
+    """
+    where = f"@origin:{{{escape_tag(origin)}}} @destination:{{{escape_tag(destination)}}}"
+    q = Query(where).sort_by("price", asc=True).paging(0, 1).dialect(2)
+    q.return_fields(*FLIGHT_RETURN_FIELDS)
+    q.result_fields = ("id", *FLIGHT_RETURN_FIELDS)
+    return KnnSearch(IDX_FLIGHTS, q, None, 1, None)
+
+
+def search_cheapest_flight(origin: str, destination: str) -> List[Dict[str, Any]]:
+    """[cheapest flight] or [] (list, like the other search_* results)."""
+    return _run_knn(lambda: plan_cheapest_flight(origin, destination))
+
+
 # ------------------------------------------------------------
 # 🚗 Transports
 # ------------------------------------------------------------
-def search_transports(city: str, k: int = 5) -> List[Dict[str, Any]]:
+def _transport_prompt(city: str) -> str:
+    return f"public and private transport options in {city}"
+
+
+def plan_transports(city: str, k: int = 5, vec_bytes: Optional[bytes] = None) -> KnnSearch:
     safe_city = escape_tag(city)
-    qvec = embed_text(f"public and private transport options in {city}")
+    if vec_bytes is None:
+        vec_bytes = embed_text_bytes(_transport_prompt(city))
     where = f"@cityName:{{{safe_city}}}"
 
-    return _knn_query(
+    return _plan_knn(
         index=IDX_TRANSPORTS,
         vector_field=EMB_TRANSPORT,
-        query_vec=qvec,
+        vec_bytes=vec_bytes,
         k=k,
         filter_str=where,
-        return_fields=["id", "mode", "provider", "cityName", "price", "description"],
+        return_fields=TRANSPORT_RETURN_FIELDS,
     )
 
 
+def search_transports(city: str, k: int = 5, vec_bytes: Optional[bytes] = None) -> List[Dict[str, Any]]:
+    return _run_knn(lambda: plan_transports(city, k, vec_bytes))
+
+
+def plan_cheapest_transport(city: str) -> KnnSearch:
+    """
+    Cheapest priced transport in a city: tag filter + SORTBY price ASC LIMIT 0 1.
+    Zero / missing prices are excluded (they would otherwise sort first).
+    """
+    where = f"@cityName:{{{escape_tag(city)}}} @price:[(0 +inf]"
+    q = Query(where).sort_by("price", asc=True).paging(0, 1).dialect(2)
+    q.return_fields(*TRANSPORT_RETURN_FIELDS)
+    q.result_fields = ("id", *TRANSPORT_RETURN_FIELDS)
+    return KnnSearch(IDX_TRANSPORTS, q, None, 1, None)
+
+
+def search_cheapest_transport(city: str) -> List[Dict[str, Any]]:
+    """[cheapest transport] or [] (list, like the other search_* results)."""
+    return _run_knn(lambda: plan_cheapest_transport(city))
+
+
+# ------------------------------------------------------------
+# 📦 Batched query vectors for one itinerary city
+# ------------------------------------------------------------
+def prepare_itinerary_vectors(
+    city: str,
+    interests: List[str],
+    max_price: float,
+    start_iso: str,
+    end_iso: str,
+) -> Dict[str, bytes]:
+    """
+    Embed the hotel / attraction / event / transport prompts for a city in
+    one embed_text_batch call. Pass each entry as `vec_bytes=` to the
+    matching search_* function (keys: hotels, attractions, events,
+    transports). Flights need no vector: see plan_cheapest_flight.
+    """
+    names = ("hotels", "attractions", "events", "transports")
+    vectors = embed_text_batch([
+        _hotel_prompt(city, max_price),
+        _attraction_prompt(city, interests),
+        _event_prompt(city, start_iso, end_iso),
+        _transport_prompt(city),
+    ])
+    return dict(zip(names, vectors))
+
+
 # ------------------------------------------------------------
 # 🧩 Multi-Index Hybrid Search (Attractions + Events + Hotels)
 # ------------------------------------------------------------
@@ -243,18 +685,88 @@ def search_city_experiences(city: str, interests: List[str], k_each: int = 5) ->
     Perfect for RAG-driven 'Things to do in Jeddah' queries.
     """
     safe_city = escape_tag(city)
-    qvec = embed_text(f"things to do, see and experience in {city} related to {', '.join(interests or [])}")
-
-    results: List[Dict[str, Any]] = []
-    results.extend(_knn_query(IDX_ATTRACTIONS, EMB_ATTR, qvec, k_each, f"@cityName:{{{safe_city}}}"))
-    results.extend(_knn_query(IDX_EVENTS,      EMB_EVENT, qvec, k_each, f"@cityName:{{{safe_city}}}"))
-    results.extend(_knn_query(IDX_HOTELS,      EMB_HOTEL, qvec, k_each, f"@cityName:{{{safe_city}}}"))
-
-    # Deduplicate by explicit 'id' if present; else fall back to 'name'
-    unique, seen = [], set()
-    for item in results:
-        iid = item.get("id") or item.get("name")
-        if iid not in seen:
-            seen.add(iid)
-            unique.append(item)
-    return unique
+    vec_bytes = embed_text_bytes(f"things to do, see and experience in {city} related to {', '.join(interests or [])}")
+    city_filter = f"@cityName:{{{safe_city}}}"
+
+    # One pipelined round-trip for all three indexes (lean: no descriptions)
+    r_attr, r_ev, r_hot = search_many([
+        _plan_knn(IDX_ATTRACTIONS, EMB_ATTR, vec_bytes, k_each, city_filter, lean=True),
+        _plan_knn(IDX_EVENTS, EMB_EVENT, vec_bytes, k_each, city_filter, lean=True),
+        _plan_knn(IDX_HOTELS, EMB_HOTEL, vec_bytes, k_each, city_filter, lean=True),
+    ])
+    unique = _dedupe_experiences(
+        (IDX_ATTRACTIONS, r_attr), (IDX_EVENTS, r_ev), (IDX_HOTELS, r_hot),
+    )
+
+    # Second, pipelined pass: descriptions for the deduped docs only
+    pipe = r_sync.pipeline(transaction=False)
+    for key, _ in unique:
+        pipe.hget(key, LAZY_FIELD)
+    try:
+        descriptions = pipe.execute(raise_on_error=False)
+    except Exception as e:
+        print(f"[Redis Error] {e} | description fetch x{len(unique)}")
+        descriptions = [None] * len(unique)
+    return _attach_descriptions(unique, descriptions)
+
+
+async def asearch_city_experiences(city: str, interests: List[str], k_each: int = 5) -> List[Dict[str, Any]]:
+    """
+    Async variant of search_city_experiences: the three FT.SEARCH calls run
+    concurrently on separate pooled connections, so wall time is the slowest
+    search rather than the sum.
+    """
+    safe_city = escape_tag(city)
+    vec_bytes = embed_text_bytes(f"things to do, see and experience in {city} related to {', '.join(interests or [])}")
+    city_filter = f"@cityName:{{{safe_city}}}"
+
+    r_attr, r_ev, r_hot = await asyncio.gather(
+        _aknn_query(IDX_ATTRACTIONS, EMB_ATTR, vec_bytes, k_each, city_filter, lean=True),
+        _aknn_query(IDX_EVENTS, EMB_EVENT, vec_bytes, k_each, city_filter, lean=True),
+        _aknn_query(IDX_HOTELS, EMB_HOTEL, vec_bytes, k_each, city_filter, lean=True),
+    )
+    unique = _dedupe_experiences(
+        (IDX_ATTRACTIONS, r_attr), (IDX_EVENTS, r_ev), (IDX_HOTELS, r_hot),
+    )
+
+    pipe = redis_async.pipeline(transaction=False)
+    for key, _ in unique:
+        pipe.hget(key, LAZY_FIELD)
+    try:
+        descriptions = await pipe.execute(raise_on_error=False)
+    except Exception as e:
+        print(f"[Redis Error] {e} | description fetch x{len(unique)}")
+        descriptions = [None] * len(unique)
+    return _attach_descriptions(unique, descriptions)
+
+
+def _dedupe_experiences(
+    *results: Tuple[str, List[Dict[str, Any]]],
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Deduplicate (index, docs) results by doc 'id', else 'name' (first wins).
+    Returns (redis_key, doc) pairs for the lazy description fetch. A search
+    doc's 'id' already is its full Redis key (redis-py sets Document.id to
+    the key); prefix + hotelId is only built for docs without one.
+    """
+    merged: Dict[Any, Tuple[str, Dict[str, Any]]] = {}
+    for index, docs in results:
+        prefix = PREFIX_MAP[index]
+        for item in docs:
+            doc_key = item.get("id")
+            dedup_key = doc_key or item.get("name")
+            if dedup_key not in merged:
+                merged[dedup_key] = (doc_key or f"{prefix}{item.get('hotelId')}", item)
+    return list(merged.values())
+
+
+def _attach_descriptions(
+    unique: List[Tuple[str, Dict[str, Any]]],
+    descriptions: List[Any],
+) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for (_, item), desc in zip(unique, descriptions):
+        if desc is not None and not isinstance(desc, Exception):
+            item[LAZY_FIELD] = decode_bytes(desc)
+        out.append(item)
+    return out
@@ -1,129 +1,443 @@
 # --------------------------------------------------------
 # 🧠 Retrieval + Itinerary Construction (Cloud Run Safe)
 # --------------------------------------------------------
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-import traceback
-
-from app.db.mongo import get_mongo_client, init_mongo
+from functools import wraps
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from app.config import settings
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from app.db.mongo import init_mongo
+from app.db.redis_client import redis_async
+from app.utils.text import city_key
+from app.db.patch_add_city_keys import CITY_FIELDS
 from app.rag.redis_vectorstores import (
     search_hotels,
     search_attractions,
     search_events,
     search_flights,
+    search_cheapest_flight,
     search_transports,
+    search_cheapest_transport,
+    plan_hotels,
+    plan_attractions,
+    plan_events,
+    plan_cheapest_flight,
+    plan_transports,
+    asearch_many,
 )
 from app.models.itinerary_models import DayPlan, FlightSegment, ItineraryPlan
-from app.schemas.itinerary_schema import ItineraryPreferences
+from app.schemas.itinerary_schema import (
+    ItineraryPreferences,
+    HotelDoc,
+    AttractionDoc,
+    EventDoc,
+    FlightDoc,
+    TransportDoc,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps  # bytes out, C-accelerated
+except ImportError:  # stdlib fallback when orjson is not installed
+    _loads, _dumps = json.loads, json.dumps
 
 
 # --------------------------------------------------------
 # 🔹 Utility — Lazy Mongo Collection Getter
 # --------------------------------------------------------
-async def get_collection_safe(name: str):
+_db: Optional[AsyncIOMotorDatabase] = None
+_collections: Dict[str, AsyncIOMotorCollection] = {}
+# Fallback docs only feed the read-only retrieve_* mappers: keep them as raw
+# BSON (no per-document dict build in the cursor) and decode on access.
+_RAW_CODEC = CodecOptions(document_class=RawBSONDocument)
+
+
+async def get_collection_safe(name: str) -> AsyncIOMotorCollection:
     """
     Ensures MongoDB connection is initialized before accessing a collection.
     Prevents import-time connection errors during Cloud Run startup.
+    The DB and collection handles are cached after the first successful init,
+    so fallback lookups skip the init_mongo() await altogether.
+    Documents come back as read-only RawBSONDocument mappings.
     """
-    try:
-        await init_mongo()  # ensure live connection (idempotent)
-        db = get_mongo_client()
-    except Exception as e:
-        print(f"❌ Failed to connect to Mongo for '{name}': {e}")
-        traceback.print_exc()
-        raise
-    return db[name]
+    global _db
+    coll = _collections.get(name)
+    if coll is not None:
+        return coll
+    if _db is None:
+        try:
+            _db = await init_mongo()  # locked + idempotent
+        except Exception as e:
+            logger.exception("❌ Failed to connect to Mongo for '%s': %s", name, e)
+            raise
+    coll = _collections[name] = _db.get_collection(name, codec_options=_RAW_CODEC)
+    return coll
 
 
 # --------------------------------------------------------
 # 🔹 Safe Redis wrappers (fallback to Mongo on error)
+# Sync RediSearch calls run in worker threads so gathered retrievals overlap.
 # --------------------------------------------------------
-async def _fallback_find(collection_name: str, query: Dict[str, Any], limit: int):
-    coll = await get_collection_safe(collection_name)
-    cursor = coll.find(query).limit(limit)
-    return await cursor.to_list(length=limit)
+# Only the fields the retrieve_* mappers below read (no embeddings / descriptions)
+FALLBACK_PROJECTIONS: Dict[str, Dict[str, int]] = {
+    "hotels": {"id": 1, "hotelId": 1, "hotelName": 1, "cityName": 1, "price": 1, "rating": 1},
+    "attractions": {"id": 1, "name": 1, "cityName": 1, "category": 1, "entry_fee": 1, "rating": 1},
+    "events": {"id": 1, "name": 1, "cityName": 1, "type": 1, "date": 1},
+    "flights": {"id": 1, "airline": 1, "flight_number": 1, "origin": 1, "destination": 1,
+                "price": 1, "duration_minutes": 1},
+    "transports": {"id": 1, "mode": 1, "type": 1, "provider": 1, "from_city": 1, "to_city": 1,
+                   "cityName": 1, "price": 1},
+}
 
-async def _safe_search_hotels(city: str, max_price: float, k: int):
-    try:
-        return search_hotels(city, max_price, k) or []
-    except Exception as e:
-        print(f"[Redis Search Error] hotels: {e}")
-        return []
 
-async def _safe_search_attractions(city: str, interests: List[str], k: int):
+# --------------------------------------------------------
+# 🔹 Known-city sets (skip guaranteed-miss Mongo fallbacks)
+# --------------------------------------------------------
+# cities:<collection> holds every `<field>_lc` value of the collection's city
+# fields (CITY_FIELDS), rebuilt on ingestion. No set → no filtering.
+KNOWN_CITIES_PREFIX = "cities:"
+
+
+async def _cities_may_exist(collection_name: str, cities: Sequence[str]) -> bool:
+    """False only if the collection's known-city set exists and lacks one of `cities`."""
+    key = f"{KNOWN_CITIES_PREFIX}{collection_name}"
     try:
-        return search_attractions(city, interests, k) or []
+        pipe = redis_async.pipeline(transaction=False)
+        pipe.exists(key)
+        for c in cities:
+            pipe.sismember(key, city_key(c))
+        exists, *members = await pipe.execute()
     except Exception as e:
-        print(f"[Redis Search Error] attractions: {e}")
+        logger.warning("⚠️ Known-city check failed (querying Mongo anyway): %s", e)
+        return True
+    return not exists or all(members)
+
+
+async def rebuild_known_cities(collection: AsyncIOMotorCollection) -> int:
+    """Atomically replace cities:<collection> from the indexed `<field>_lc` keys."""
+    fields = CITY_FIELDS.get(collection.name)
+    if not fields:
+        return 0
+    cities = set()
+    for field in fields:
+        cities.update(c for c in await collection.distinct(f"{field}_lc") if isinstance(c, str) and c)
+
+    key = f"{KNOWN_CITIES_PREFIX}{collection.name}"
+    pipe = redis_async.pipeline(transaction=True)
+    if cities:
+        tmp = f"{key}:tmp"
+        pipe.delete(tmp)
+        pipe.sadd(tmp, *cities)
+        pipe.rename(tmp, key)
+    else:
+        pipe.delete(key)  # nothing known: don't filter
+    await pipe.execute()
+    return len(cities)
+
+
+async def _fallback_find(
+    collection_name: str,
+    query: Dict[str, Any],
+    limit: int,
+    projection: Optional[Dict[str, int]] = None,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    cities: Sequence[str] = (),
+):
+    # Queries match normalized `<field>_lc` keys (indexed equality, no regex
+    # scan); ensure_embeddings_for_collection backfills them on older data at
+    # startup (backfill_city_keys).
+    if cities and not await _cities_may_exist(collection_name, cities):
         return []
+    coll = await get_collection_safe(collection_name)
+    if projection is None:
+        projection = FALLBACK_PROJECTIONS.get(collection_name)
+    cursor = coll.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    cursor = cursor.limit(limit)
+    return await cursor.to_list(length=limit)
+
+# Short-TTL cache across builds: the same city / hub / origin recurs between
+# requests, so identical searches within SEARCH_CACHE_TTL are a dict lookup.
+# Empty results (errors, misses) are not cached.
+_SEARCH_CACHE: Dict[tuple, Tuple[float, List[Dict[str, Any]]]] = {}
 
-async def _safe_search_events(city: str, start_iso: str, end_iso: str, k: int):
+
+def _memo_arg(v: Any) -> Any:
+    # Cache-key form: "Paris" / " paris" and reordered interests share an entry
+    if isinstance(v, str):
+        return city_key(v)
+    if isinstance(v, (list, tuple)):
+        return tuple(sorted(map(_memo_arg, v), key=repr))
+    return v
+
+
+def _safe_search(name: str, search_fn):
+    """
+    Async, TTL-cached, never-raising wrapper around a sync search_* function:
+    runs it in a worker thread and returns [] (logged) on any error.
+    """
+    async def wrapper(*args, **kwargs):
+        # vec_bytes is derived from the other args: not part of the key
+        key = (name, *map(_memo_arg, args),
+               *sorted((k, _memo_arg(v)) for k, v in kwargs.items() if k != "vec_bytes"))
+        now = time.monotonic()
+        hit = _SEARCH_CACHE.get(key)
+        if hit is not None and hit[0] > now:
+            return list(hit[1])
+        try:
+            docs = await asyncio.to_thread(search_fn, *args, **kwargs) or []
+        except Exception as e:
+            logger.warning("[Redis Search Error] %s: %s", name, e)
+            return []
+        if docs:
+            if len(_SEARCH_CACHE) >= settings.SEARCH_CACHE_SIZE:
+                _SEARCH_CACHE.pop(next(iter(_SEARCH_CACHE)))  # oldest entry
+            _SEARCH_CACHE[key] = (now + settings.SEARCH_CACHE_TTL, docs)
+        return list(docs)
+    wrapper.__name__ = f"_safe_search_{name.replace(' ', '_')}"
+    return wrapper
+
+
+_safe_search_hotels = _safe_search("hotels", search_hotels)
+_safe_search_attractions = _safe_search("attractions", search_attractions)
+_safe_search_events = _safe_search("events", search_events)
+_safe_search_flights = _safe_search("flights", search_flights)
+_safe_search_cheapest_flight = _safe_search("cheapest flight", search_cheapest_flight)
+_safe_search_transports = _safe_search("transports", search_transports)
+_safe_search_cheapest_transport = _safe_search("cheapest transport", search_cheapest_transport)
+
+
+async def _safe_search_many(searches) -> List[List[Dict[str, Any]]]:
+    """Several prepared RediSearch queries in one pipelined round-trip."""
     try:
-        return search_events(city, start_iso, end_iso, k) or []
+        return await asearch_many(searches)
     except Exception as e:
-        print(f"[Redis Search Error] events: {e}")
-        return []
+        logger.warning("[Redis Search Error] pipelined x%d: %s", len(searches), e)
+        return [[] for _ in searches]
+
+
+# --------------------------------------------------------
+# 🔹 Per-build memo (duplicate retrievals share one in-flight call)
+# --------------------------------------------------------
+_RETRIEVAL_MEMO: ContextVar[Optional[Dict[tuple, "asyncio.Future"]]] = ContextVar("_RETRIEVAL_MEMO", default=None)
 
-async def _safe_search_flights(origin: str, destination: str, k: int):
+
+@contextmanager
+def retrieval_scope():
+    """
+    Within this block, identical retrieve_* calls (same function + args) are
+    issued once; concurrent duplicates await the same pending future.
+    """
+    token = _RETRIEVAL_MEMO.set({})
     try:
-        return search_flights(origin, destination, k) or []
-    except Exception as e:
-        print(f"[Redis Search Error] flights: {e}")
-        return []
+        yield
+    finally:
+        _RETRIEVAL_MEMO.reset(token)
+
+
+_MEMO_SKIP = frozenset(("vec_bytes", "prefetched"))
+
+
+RETRIEVAL_CACHE_PREFIX = "rcache:"
+
 
-async def _safe_search_transports(city: str, k: int):
+def _rcache_key(key: tuple) -> str:
+    digest = hashlib.blake2b(repr(key[1:]).encode(), digest_size=16).hexdigest()
+    return f"{RETRIEVAL_CACHE_PREFIX}{key[0]}:{digest}"
+
+
+def _retrieval_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> tuple:
+    # vec_bytes / prefetched derive from the other args: not part of the key
+    return (name, *map(_memo_arg, args),
+            *sorted((k, _memo_arg(v)) for k, v in kwargs.items() if k not in _MEMO_SKIP))
+
+
+async def _shared_retrieval(fn, key: tuple, args: tuple, kwargs: Dict[str, Any]):
+    """
+    Cross-process layer: mapped retrieve_* results are kept in Redis for
+    RETRIEVAL_CACHE_TTL. The read is skipped when results were prefetched
+    (the search already ran, see retrieve_many); empty results are not stored.
+    """
+    rkey = _rcache_key(key)
+    if kwargs.get("prefetched") is None:
+        try:
+            cached = await redis_async.get(rkey)
+            if cached is not None:
+                return _loads(cached)
+        except Exception as e:
+            logger.warning("⚠️ Retrieval cache read failed: %s", e)
+
+    res = await fn(*args, **kwargs)
+    if res:
+        try:
+            await redis_async.set(rkey, _dumps(res, default=str), ex=settings.RETRIEVAL_CACHE_TTL)
+        except Exception as e:
+            logger.warning("⚠️ Retrieval cache write failed: %s", e)
+    return res
+
+
+async def invalidate_retrieval_cache() -> int:
+    """
+    Drop cached retrievals (Redis + this process) after new data is ingested.
+    Returns the number of Redis keys removed.
+    """
+    _SEARCH_CACHE.clear()
+    removed = 0
+    for prefix in (RETRIEVAL_CACHE_PREFIX, HUB_ROUTE_PREFIX):
+        keys = [k async for k in redis_async.scan_iter(match=f"{prefix}*", count=1000)]
+        if not keys:
+            continue
+        pipe = redis_async.pipeline(transaction=False)
+        for i in range(0, len(keys), 500):
+            pipe.unlink(*keys[i:i + 500])
+        removed += sum(await pipe.execute())
+    return removed
+
+
+def _memoized_retrieval(fn):
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = _retrieval_key(fn.__name__, args, kwargs)
+        memo = _RETRIEVAL_MEMO.get()
+        if memo is None:
+            return await _shared_retrieval(fn, key, args, kwargs)
+        fut = memo.get(key)
+        if fut is None:
+            fut = memo[key] = asyncio.ensure_future(_shared_retrieval(fn, key, args, kwargs))
+        res = await fut
+        return list(res) if isinstance(res, list) else res  # callers get their own list
+    return wrapper
+
+
+async def _peek_retrievals(calls) -> List[Any]:
+    """One MGET for several retrievals: cached results, None for misses."""
+    keys = [_retrieval_key(fn.__name__, args, kwargs) for fn, _, args, kwargs in calls]
     try:
-        return search_transports(city, k) or []
+        blobs = await redis_async.mget([_rcache_key(k) for k in keys])
     except Exception as e:
-        print(f"[Redis Search Error] transports: {e}")
-        return []
+        logger.warning("⚠️ Retrieval cache read failed: %s", e)
+        return [None] * len(calls)
+
+    memo = _RETRIEVAL_MEMO.get()
+    results = []
+    for key, blob in zip(keys, blobs):
+        res = _loads(blob) if blob is not None else None
+        if res is not None and memo is not None and key not in memo:
+            # Later identical calls in this build are memo hits
+            fut = memo[key] = asyncio.get_running_loop().create_future()
+            fut.set_result(res)
+        results.append(list(res) if isinstance(res, list) else res)
+    return results
+
+
+async def retrieve_many(calls) -> List[Any]:
+    """
+    Several retrieve_* calls, cache first: one MGET against the retrieval
+    cache, then only the misses are searched (one pipelined round-trip) and
+    mapped, with fallbacks, concurrently.
+
+    calls: (retrieve_fn, plan_fn, args, kwargs), where plan_fn() builds the
+    KnnSearch for that retrieval (only called on a miss).
+    """
+    results = await _peek_retrievals(calls)
+    misses = [calls[i] for i, r in enumerate(results) if r is None]
+    if misses:
+        raws = await _safe_search_many([plan() for _, plan, _, _ in misses])
+        fetched = iter(await asyncio.gather(*(
+            fn(*args, prefetched=raw, **kwargs)
+            for (fn, _, args, kwargs), raw in zip(misses, raws)
+        )))
+        results = [next(fetched) if r is None else r for r in results]
+    return results
 
 
 # --------------------------------------------------------
 # 🔹 Retrieval Helpers (Hotels / Attractions / Events / Flights / Transports)
 # --------------------------------------------------------
-async def retrieve_hotels(city: str, max_price: float, k: int = 8) -> List[Dict[str, Any]]:
-    docs = await _safe_search_hotels(city, max_price, k)
+def _safe_float(v: Any) -> float:
+    # None / "" / 0 → 0.0 (Redis hands back strings, Mongo numbers)
+    return float(v) if v else 0.0
+
+
+def _doc_id(d: Dict[str, Any]) -> str:
+    return str(d.get("_id") or d.get("id"))
+
+
+@_memoized_retrieval
+async def retrieve_hotels(
+    city: str, max_price: float, k: int = 8, vec_bytes: Optional[bytes] = None,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> List[HotelDoc]:
+    docs = prefetched if prefetched is not None else await _safe_search_hotels(city, max_price, k, vec_bytes=vec_bytes)
     if not docs:
-        docs = await _fallback_find("hotels", {"cityName": {"$regex": f"^{city}$", "$options": "i"}}, k)
+        docs = await _fallback_find("hotels", {"cityName_lc": city_key(city)}, k, cities=(city,))
     return [
         {
-            "id": str(d.get("_id") or d.get("id")),
+            "id": _doc_id(d),
             "hotelId": d.get("hotelId"),
             "hotelName": d.get("hotelName"),
             "cityName": d.get("cityName"),
-            "price": float(d.get("price", 0) or 0),
-            "rating": float(d.get("rating", 0) or 0),
+            "price": _safe_float(d.get("price")),
+            "rating": _safe_float(d.get("rating")),
             "source": "redis" if "embedding" in d else "mongo",
         }
         for d in docs
     ]
 
-async def retrieve_attractions(city: str, interests: List[str], k: int = 12) -> List[Dict[str, Any]]:
-    docs = await _safe_search_attractions(city, interests, k)
+@_memoized_retrieval
+async def retrieve_attractions(
+    city: str, interests: List[str], k: int = 12, vec_bytes: Optional[bytes] = None,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+    max_fee: Optional[float] = None,
+) -> List[AttractionDoc]:
+    """Attractions for `city`; with `max_fee`, only those the day's budget can cover."""
+    if prefetched is not None:
+        docs = prefetched
+    else:
+        docs = await _safe_search_attractions(city, interests, k, vec_bytes=vec_bytes, max_fee=max_fee)
     if not docs:
-        docs = await _fallback_find("attractions", {"cityName": {"$regex": f"^{city}$", "$options": "i"}}, k)
+        query: Dict[str, Any] = {"cityName_lc": city_key(city)}
+        if max_fee is not None:
+            query["entry_fee"] = {"$not": {"$gt": max_fee}}  # missing fee still matches
+        docs = await _fallback_find("attractions", query, k, cities=(city,))
     return [
         {
-            "id": str(d.get("_id") or d.get("id")),
+            "id": _doc_id(d),
             "name": d.get("name"),
             "cityName": d.get("cityName"),
             "category": d.get("category"),
-            "entry_fee": float(d.get("entry_fee", 0) or 0),
+            "entry_fee": _safe_float(d.get("entry_fee")),
             "duration_min": 120,
-            "rating": float(d.get("rating", 0) or 0),
+            "rating": _safe_float(d.get("rating")),
             "source": "redis" if "embedding" in d else "mongo",
         }
         for d in docs
     ]
 
-async def retrieve_events(city: str, start_iso: str, end_iso: str, k: int = 8) -> List[Dict[str, Any]]:
-    docs = await _safe_search_events(city, start_iso, end_iso, k)
+@_memoized_retrieval
+async def retrieve_events(
+    city: str, start_iso: str, end_iso: str, k: int = 8, vec_bytes: Optional[bytes] = None,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> List[EventDoc]:
+    docs = prefetched if prefetched is not None else await _safe_search_events(city, start_iso, end_iso, k, vec_bytes=vec_bytes)
     if not docs:
-        docs = await _fallback_find("events", {"cityName": {"$regex": f"^{city}$", "$options": "i"}}, k)
+        docs = await _fallback_find("events", {"cityName_lc": city_key(city)}, k, cities=(city,))
     return [
         {
-            "id": str(d.get("_id") or d.get("id")),
+            "id": _doc_id(d),
             "name": d.get("name"),
             "cityName": d.get("cityName"),
             "type": d.get("type"),
@@ -133,53 +447,220 @@ async def retrieve_events(city: str, start_iso: str, end_iso: str, k: int = 8) -
         for d in docs
     ]
 
-async def retrieve_flights(origin: str, destination: str, k: int = 5) -> List[Dict[str, Any]]:
-    docs = await _safe_search_flights(origin, destination, k)
+def _flight_doc(d: Dict[str, Any]) -> FlightDoc:
+    return {
+        "id": _doc_id(d),
+        "airline": d.get("airline"),
+        "flight_number": d.get("flight_number"),
+        "from": d.get("origin"),
+        "to": d.get("destination"),
+        "price": _safe_float(d.get("price")),
+        "duration": d.get("duration_minutes", 0),
+        "source": "redis" if "embedding" in d else "mongo",
+    }
+
+
+def _transport_doc(d: Dict[str, Any]) -> TransportDoc:
+    return {
+        "id": _doc_id(d),
+        "mode": d.get("mode") or d.get("type"),
+        "provider": d.get("provider") or "Local Transport",
+        "from_city": d.get("from_city") or d.get("cityName"),
+        "to_city": d.get("to_city") or d.get("cityName"),
+        "price": _safe_float(d.get("price")),
+        "source": "redis" if "embedding" in d else "mongo",
+    }
+
+
+@_memoized_retrieval
+async def retrieve_flights(
+    origin: str, destination: str, k: int = 5, vec_bytes: Optional[bytes] = None,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> List[FlightDoc]:
+    docs = prefetched if prefetched is not None else await _safe_search_flights(origin, destination, k, vec_bytes=vec_bytes)
     if not docs:
         docs = await _fallback_find(
             "flights",
-            {"origin": {"$regex": f"^{origin}$", "$options": "i"},
-             "destination": {"$regex": f"^{destination}$", "$options": "i"}},
+            {"origin_lc": city_key(origin), "destination_lc": city_key(destination)},
             k,
+            cities=(origin, destination),
         )
-    return [
-        {
-            "id": str(d.get("_id") or d.get("id")),
-            "airline": d.get("airline"),
-            "flight_number": d.get("flight_number"),
-            "from": d.get("origin"),
-            "to": d.get("destination"),
-            "price": float(d.get("price", 0) or 0),
-            "duration": d.get("duration_minutes", 0),
-            "source": "redis" if "embedding" in d else "mongo",
-        }
-        for d in docs
-    ]
+    return [_flight_doc(d) for d in docs]
+
 
-async def retrieve_transports(city: str, k: int = 5) -> List[Dict[str, Any]]:
-    docs = await _safe_search_transports(city, k)
+@_memoized_retrieval
+async def retrieve_cheapest_flight(
+    origin: str, destination: str,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> Optional[FlightDoc]:
+    """Cheapest origin→destination flight (Redis SORTBY / Mongo sort, 1 doc), or None."""
+    docs = prefetched if prefetched is not None else await _safe_search_cheapest_flight(origin, destination)
+    if not docs:
+        docs = await _fallback_find(
+            "flights",
+            {"origin_lc": city_key(origin), "destination_lc": city_key(destination)},
+            1,
+            sort=[("price", 1)],
+            cities=(origin, destination),
+        )
+    return _flight_doc(docs[0]) if docs else None
+
+@_memoized_retrieval
+async def retrieve_transports(
+    city: str, k: int = 5, vec_bytes: Optional[bytes] = None,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> List[TransportDoc]:
+    docs = prefetched if prefetched is not None else await _safe_search_transports(city, k, vec_bytes=vec_bytes)
     if not docs:
         docs = await _fallback_find(
             "transports",
             {"$or": [
-                {"from_city": {"$regex": f"^{city}$", "$options": "i"}},
-                {"to_city": {"$regex": f"^{city}$", "$options": "i"}},
-                {"cityName": {"$regex": f"^{city}$", "$options": "i"}},
+                {"from_city_lc": city_key(city)},
+                {"to_city_lc": city_key(city)},
+                {"cityName_lc": city_key(city)},
             ]},
             k,
+            cities=(city,),
+        )
+    return [_transport_doc(d) for d in docs]
+
+
+@_memoized_retrieval
+async def retrieve_cheapest_transport(
+    city: str,
+    prefetched: Optional[List[Dict[str, Any]]] = None,
+) -> Optional[TransportDoc]:
+    """Cheapest priced transport in a city (Redis SORTBY / Mongo sort, 1 doc), or None."""
+    docs = prefetched if prefetched is not None else await _safe_search_cheapest_transport(city)
+    if not docs:
+        docs = await _fallback_find(
+            "transports",
+            {"$or": [
+                {"from_city_lc": city_key(city)},
+                {"to_city_lc": city_key(city)},
+                {"cityName_lc": city_key(city)},
+            ], "price": {"$gt": 0}},
+            1,
+            sort=[("price", 1)],
+            cities=(city,),
         )
+    return _transport_doc(docs[0]) if docs else None
+
+
+# --------------------------------------------------------
+# 🔀 Transit-hub fallback (all hubs queried concurrently)
+# --------------------------------------------------------
+HUB_ROUTE_PREFIX = "hub_route:"
+
+
+def _hub_route_key(origin: str, destination: str, hubs: Sequence[str]) -> str:
+    return f"{HUB_ROUTE_PREFIX}{city_key(origin)}:{city_key(destination)}:{','.join(map(city_key, hubs))}"
+
+
+async def _best_hub_route(
+    origin: str, destination: str, hubs: Sequence[str],
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    First complete (first_leg, second_leg) pair via `hubs`, in priority order, or None.
+    A resolved route is materialized in Redis for CACHE_TTL, so repeat lookups
+    cost a single GET instead of 2×len(hubs) searches; "no route" is only kept
+    for HUB_ROUTE_NEGATIVE_TTL.
+    """
+    key = _hub_route_key(origin, destination, hubs)
+    try:
+        cached = await redis_async.get(key)
+        if cached is not None:
+            route = _loads(cached)
+            return tuple(route) if route else None
+    except Exception as e:
+        logger.warning("⚠️ Hub route cache read failed: %s", e)
+
+    best = await _resolve_hub_route(origin, destination, hubs)
+    try:
+        if best:
+            await redis_async.set(key, _dumps(list(best)), ex=settings.CACHE_TTL)
+        else:
+            await redis_async.set(key, _dumps(None), ex=settings.HUB_ROUTE_NEGATIVE_TTL)
+    except Exception as e:
+        logger.warning("⚠️ Hub route cache write failed: %s", e)
+    return best
+
+
+async def _resolve_hub_route(
+    origin: str, destination: str, hubs: Sequence[str],
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Fetch origin→hub and hub→destination for every hub at once and return the
+    first complete (first_leg, second_leg) pair in `hubs` order, or None.
+    """
+    # Every leg's cheapest-flight query in one pipeline; Mongo fallbacks only for misses
+    legs = [(origin, hub) for hub in hubs] + [(hub, destination) for hub in hubs]
+    raw = await _safe_search_many([plan_cheapest_flight(a, b) for a, b in legs])
+    flights = dict(zip(legs, raw))
+    results = await asyncio.gather(
+        *(asyncio.gather(
+            retrieve_cheapest_flight(origin, hub, prefetched=flights[(origin, hub)]),
+            retrieve_cheapest_flight(hub, destination, prefetched=flights[(hub, destination)]),
+        ) for hub in hubs),
+        return_exceptions=True,
+    )
+    for res in results:
+        if isinstance(res, BaseException):
+            logger.warning("⚠️ Hub route lookup failed: %s", res)
+            continue
+        f1, f2 = res
+        if f1 and f2:
+            return f1, f2
+    return None
+
+
+INTERNATIONAL_HUBS = ("Dubai", "Doha", "Abu Dhabi")
+DOMESTIC_HUBS = ("Riyadh", "Jeddah", "Dammam")
+
+
+def _segment(f: Dict[str, Any], airline: str) -> FlightSegment:
+    return FlightSegment.model_construct(
+        airline=f.get("airline", airline),
+        from_city=f.get("from"),
+        to_city=f.get("to"),
+        price=f.get("price", 0),
+        duration_minutes=f.get("duration", 0),
+    )
+
+
+async def _plan_leg(
+    src: str,
+    dst: str,
+    hubs: Sequence[str],
+    direct_airline: str = "International Airline",
+    fallback_airline: str = "Fallback Route",
+    fallback_price: float = 1800,
+    fallback_duration: int = 420,
+) -> Tuple[List[FlightSegment], float]:
+    """
+    One travel leg: cheapest direct flight, else cheapest route via `hubs`
+    (the leg's own endpoints are never used as a hub), else a fixed fallback
+    segment. Returns (segments, cost).
+    """
+    best = await retrieve_cheapest_flight(src, dst)
+    if best:
+        return [_segment(best, direct_airline)], best.get("price", 0)
+
+    excluded = {src.casefold(), dst.casefold()}
+    route = await _best_hub_route(src, dst, [h for h in hubs if h.casefold() not in excluded])
+    if route:
+        f1, f2 = route
+        return [_segment(f1, "Transit"), _segment(f2, "Transit")], f1.get("price", 0) + f2.get("price", 0)
+
     return [
-        {
-            "id": str(d.get("_id") or d.get("id")),
-            "mode": d.get("mode") or d.get("type"),
-            "provider": d.get("provider") or "Local Transport",
-            "from_city": d.get("from_city") or d.get("cityName"),
-            "to_city": d.get("to_city") or d.get("cityName"),
-            "price": float(d.get("price", 0) or 0),
-            "source": "redis" if "embedding" in d else "mongo",
-        }
-        for d in docs
-    ]
+        FlightSegment.model_construct(
+            airline=fallback_airline,
+            from_city=src,
+            to_city=dst,
+            price=fallback_price,
+            duration_minutes=fallback_duration,
+        )
+    ], fallback_price
 
 
 # --------------------------------------------------------
@@ -188,16 +669,103 @@ async def retrieve_transports(city: str, k: int = 5) -> List[Dict[str, Any]]:
 async def build_itinerary(prefs: ItineraryPreferences) -> ItineraryPlan:
     """
     Builds a multi-city itinerary plan (hotels, attractions, flights, transports).
+    Repeated lookups (e.g. the same hub legs) are fetched once per build.
     """
-    try:
-        await init_mongo()
-    except Exception as e:
-        print(f"⚠️ Mongo initialization failed during itinerary build: {e}")
-        traceback.print_exc()
+    with retrieval_scope():
+        return await _build_itinerary(prefs)
+
+
+# Each builder returns (day field dicts in order, flights cost); day_index is
+# assigned once all parts are joined, so the parts can run concurrently.
+DayParts = Tuple[List[Dict[str, Any]], float]
+
+
+async def _build_entry_leg(prefs: ItineraryPreferences) -> DayParts:
+    """Entry flight from origin → first destination."""
+    if not (getattr(prefs, "origin", None) and prefs.destination):
+        return [], 0
+    entry_city = prefs.destination[0]
+    logger.debug("✈️ Entry route: %s → %s", prefs.origin, entry_city)
+
+    segments, cost = await _plan_leg(prefs.origin, entry_city, INTERNATIONAL_HUBS)
+    return [dict(
+        city=prefs.origin,
+        flight=segments[0],
+        notes=f"Travel day from {prefs.origin} → {entry_city}",
+        estimated_day_cost=0,
+    )], cost
+
+
+async def _build_city_day(prefs: ItineraryPreferences, city: str, max_per_city: float) -> Dict[str, Any]:
+    logger.debug("🏙️ Planning %s", city)
+
+    # Cached retrievals come back from one MGET; the rest share one pipelined
+    # search round-trip, then their (independent) Mongo fallbacks run concurrently
+    hotels, attractions, events, transports = await retrieve_many([
+        (retrieve_hotels, lambda: plan_hotels(city, max_per_city), (city, max_per_city), {}),
+        (retrieve_attractions, lambda: plan_attractions(city, prefs.interests), (city, prefs.interests), {}),
+        (retrieve_events, lambda: plan_events(city, prefs.start_date, prefs.end_date),
+         (city, prefs.start_date, prefs.end_date), {}),
+        (retrieve_transports, lambda: plan_transports(city), (city,), {}),
+    ])
+    hotel = hotels[0] if hotels else None
+    return dict(
+        city=city,
+        hotel=hotel,
+        activities=attractions[:3] + events[:1],
+        transport_segments=transports[:3],
+        flight=None,
+        notes=f"Auto-generated day in {city}",
+        estimated_day_cost=hotel["price"] if hotel else 0,
+    )
 
-    all_days: List[DayPlan] = []
-    flights_total = 0
-    current_day_index = 1
+
+async def _build_hop(city: str, next_city: str) -> DayParts:
+    """Intercity transfer: one travel day per flight segment."""
+    logger.debug("✈️ Route %s → %s", city, next_city)
+    segments, cost = await _plan_leg(
+        city, next_city, DOMESTIC_HUBS,
+        direct_airline="Local Airline",
+        fallback_airline="Road Route", fallback_price=300, fallback_duration=360,
+    )
+    return [dict(
+        city=seg.from_city,
+        flight=seg,
+        notes=f"Travel day: {seg.from_city} → {seg.to_city}",
+        estimated_day_cost=0,
+    ) for seg in segments], cost
+
+
+async def _build_city(prefs: ItineraryPreferences, idx: int, max_per_city: float) -> DayParts:
+    """The city's day, plus the hop to the next destination if there is one."""
+    city = prefs.destination[idx]
+    if idx == len(prefs.destination) - 1:
+        return [await _build_city_day(prefs, city, max_per_city)], 0
+    day, (hop_days, cost) = await asyncio.gather(
+        _build_city_day(prefs, city, max_per_city),
+        _build_hop(city, prefs.destination[idx + 1]),
+    )
+    return [day, *hop_days], cost
+
+
+async def _build_return_leg(prefs: ItineraryPreferences) -> DayParts:
+    """Return flight from the last destination → origin."""
+    if not (getattr(prefs, "origin", None) and prefs.destination):
+        return [], 0
+    last_city = prefs.destination[-1]
+    logger.debug("🛫 Return route: %s → %s", last_city, prefs.origin)
+
+    segments, cost = await _plan_leg(last_city, prefs.origin, INTERNATIONAL_HUBS)
+    return [dict(
+        city=last_city,
+        flight=segments[0],
+        notes=f"Return flight from {last_city} → {prefs.origin}",
+        estimated_day_cost=0,
+    )], cost
+
+
+async def _build_itinerary(prefs: ItineraryPreferences) -> ItineraryPlan:
+    # Mongo is only touched on the fallback path; get_collection_safe inits it lazily
     num_cities = len(prefs.destination)
 
     # Use max_budget_per_city if available; else derive from total
@@ -205,196 +773,22 @@ async def build_itinerary(prefs: ItineraryPreferences) -> ItineraryPlan:
         0, (getattr(prefs, "budget_total", 0) or 0) // max(1, num_cities or 1)
     )
 
-    # 1️⃣ Entry flight from origin → first destination   <-- CHANGED: origin
-    if getattr(prefs, "origin", None) and prefs.destination:
-        entry_city = prefs.destination[0]
-        print(f"✈️ Entry route: {prefs.origin} → {entry_city}")
-
-        entry_flight = await retrieve_flights(prefs.origin, entry_city)
-        entry_segments = []
-
-        if entry_flight:
-            best = sorted(entry_flight, key=lambda f: f.get("price", 999999))[0]
-            flights_total += best.get("price", 0)
-            entry_segments.append(
-                FlightSegment(
-                    airline=best.get("airline", "International Airline"),
-                    from_city=best.get("from"),
-                    to_city=best.get("to"),
-                    price=best.get("price", 0),
-                    duration_minutes=best.get("duration", 0),
-                )
-            )
-        else:
-            for hub in ["Dubai", "Doha", "Abu Dhabi"]:
-                first_leg = await retrieve_flights(prefs.origin, hub)
-                second_leg = await retrieve_flights(hub, entry_city)
-                if first_leg and second_leg:
-                    f1 = sorted(first_leg, key=lambda f: f.get("price", 999999))[0]
-                    f2 = sorted(second_leg, key=lambda f: f.get("price", 999999))[0]
-                    flights_total += f1.get("price", 0) + f2.get("price", 0)
-                    entry_segments.extend([
-                        FlightSegment(airline=f1.get("airline", "Transit"), from_city=f1.get("from"), to_city=f1.get("to"), price=f1.get("price", 0), duration_minutes=f1.get("duration", 0)),
-                        FlightSegment(airline=f2.get("airline", "Transit"), from_city=f2.get("from"), to_city=f2.get("to"), price=f2.get("price", 0), duration_minutes=f2.get("duration", 0))
-                    ])
-                    break
-            if not entry_segments:
-                entry_segments.append(
-                    FlightSegment(
-                        airline="Fallback Route",
-                        from_city=prefs.origin,
-                        to_city=entry_city,
-                        price=1800,
-                        duration_minutes=420,
-                    )
-                )
-                flights_total += 1800
-
-        all_days.append(
-            DayPlan(
-                day_index=current_day_index,
-                city=prefs.origin,
-                flight=entry_segments[0],
-                notes=f"Travel day from {prefs.origin} → {entry_city}",
-                estimated_day_cost=0,
-            )
-        )
-        current_day_index += 1
-
-    # 2️⃣ For each destination city
-    for idx, city in enumerate(prefs.destination):
-        print(f"🏙️ Planning {city}")
-
-        hotels = await retrieve_hotels(city, max_per_city)
-        hotel = hotels[0] if hotels else None
-        attractions = await retrieve_attractions(city, prefs.interests)
-        events = await retrieve_events(city, prefs.start_date, prefs.end_date)
-        transports = await retrieve_transports(city)
-
-        all_days.append(
-            DayPlan(
-                day_index=current_day_index,
-                city=city,
-                hotel=hotel,
-                activities=attractions[:3] + events[:1],
-                transport_segments=transports[:3],
-                flight=None,
-                notes=f"Auto-generated day in {city}",
-                estimated_day_cost=hotel["price"] if hotel else 0,
-            )
-        )
-        current_day_index += 1
-
-        # ✈️ Intercity transfers
-        if idx < num_cities - 1:
-            next_city = prefs.destination[idx + 1]
-            print(f"✈️ Route {city} → {next_city}")
-            hop_flight = await retrieve_flights(city, next_city)
-            segments = []
-
-            if hop_flight:
-                best = sorted(hop_flight, key=lambda f: f.get("price", 999999))[0]
-                flights_total += best.get("price", 0)
-                segments.append(
-                    FlightSegment(
-                        airline=best.get("airline", "Local Airline"),
-                        from_city=best.get("from"),
-                        to_city=best.get("to"),
-                        price=best.get("price", 0),
-                        duration_minutes=best.get("duration", 0),
-                    )
-                )
-            else:
-                for hub in ["Riyadh", "Jeddah", "Dammam"]:
-                    if hub.lower() in [city.lower(), next_city.lower()]:
-                        continue
-                    first_leg = await retrieve_flights(city, hub)
-                    second_leg = await retrieve_flights(hub, next_city)
-                    if first_leg and second_leg:
-                        f1 = sorted(first_leg, key=lambda f: f.get("price", 999999))[0]
-                        f2 = sorted(second_leg, key=lambda f: f.get("price", 999999))[0]
-                        flights_total += f1.get("price", 0) + f2.get("price", 0)
-                        segments.extend([
-                            FlightSegment(airline=f1.get("airline", "Transit"), from_city=f1.get("from"), to_city=f1.get("to"), price=f1.get("price", 0), duration_minutes=f1.get("duration", 0)),
-                            FlightSegment(airline=f2.get("airline", "Transit"), from_city=f2.get("from"), to_city=f2.get("to"), price=f2.get("price", 0), duration_minutes=f2.get("duration", 0))
-                        ])
-                        break
-                if not segments:
-                    segments.append(
-                        FlightSegment(airline="Road Route", from_city=city, to_city=next_city, price=300, duration_minutes=360)
-                    )
-                    flights_total += 300
-
-            for seg in segments:
-                all_days.append(
-                    DayPlan(
-                        day_index=current_day_index,
-                        city=seg.from_city,
-                        flight=seg,
-                        notes=f"Travel day: {seg.from_city} → {seg.to_city}",
-                        estimated_day_cost=0,
-                    )
-                )
-                current_day_index += 1
-
-    # 3️⃣ Return flight to origin   <-- CHANGED: origin
-    if getattr(prefs, "origin", None) and prefs.destination:
-        last_city = prefs.destination[-1]
-        print(f"🛫 Return route: {last_city} → {prefs.origin}")
-
-        return_flight = await retrieve_flights(last_city, prefs.origin)
-        return_segments = []
-
-        if return_flight:
-            best = sorted(return_flight, key=lambda f: f.get("price", 999999))[0]
-            flights_total += best.get("price", 0)
-            return_segments.append(
-                FlightSegment(
-                    airline=best.get("airline", "International Airline"),
-                    from_city=best.get("from"),
-                    to_city=best.get("to"),
-                    price=best.get("price", 0),
-                    duration_minutes=best.get("duration", 0),
-                )
-            )
-        else:
-            for hub in ["Dubai", "Doha", "Abu Dhabi"]:
-                first_leg = await retrieve_flights(last_city, hub)
-                second_leg = await retrieve_flights(hub, prefs.origin)
-                if first_leg and second_leg:
-                    f1 = sorted(first_leg, key=lambda f: f.get("price", 999999))[0]
-                    f2 = sorted(second_leg, key=lambda f: f.get("price", 999999))[0]
-                    flights_total += f1.get("price", 0) + f2.get("price", 0)
-                    return_segments.extend([
-                        FlightSegment(airline=f1.get("airline", "Transit"), from_city=f1.get("from"), to_city=f1.get("to"), price=f1.get("price", 0), duration_minutes=f1.get("duration", 0)),
-                        FlightSegment(airline=f2.get("airline", "Transit"), from_city=f2.get("from"), to_city=f2.get("to"), price=f2.get("price", 0), duration_minutes=f2.get("duration", 0))
-                    ])
-                    break
-            if not return_segments:
-                return_segments.append(
-                    FlightSegment(
-                        airline="Fallback Route",
-                        from_city=last_city,
-                        to_city=prefs.origin,
-                        price=1800,
-                        duration_minutes=420,
-                    )
-                )
-                flights_total += 1800
-
-        all_days.append(
-            DayPlan(
-                day_index=current_day_index,
-                city=last_city,
-                flight=return_segments[0],
-                notes=f"Return flight from {last_city} → {prefs.origin}",
-                estimated_day_cost=0,
-            )
-        )
+    # Entry leg, every city (+ its onward hop) and the return leg are
+    # independent: build them concurrently, then join in itinerary order
+    parts = await asyncio.gather(
+        _build_entry_leg(prefs),
+        *(_build_city(prefs, idx, max_per_city) for idx in range(num_cities)),
+        _build_return_leg(prefs),
+    )
+    all_days = [
+        DayPlan(day_index=i, **fields)
+        for i, fields in enumerate((f for days, _ in parts for f in days), start=1)
+    ]
+    flights_total = sum(cost for _, cost in parts)
 
-    # ✅ Final itinerary output
+    # ✅ Final itinerary output (ns-resolution id: no same-second collisions)
     return ItineraryPlan(
-        trip_id=f"TRIP-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+        trip_id=f"TRIP-{time.time_ns()}",
         created_at=datetime.utcnow(),
         days=all_days,
         cost_summary={"flights_total": flights_total},
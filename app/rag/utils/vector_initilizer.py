@@ -1,11 +1,32 @@
+import asyncio
+from typing import List, Tuple
+
 import redis
-import numpy as np
-from app.embeddings.embed_text import embed_text
-from app.config import settings
+from bson.binary import Binary
+from pymongo import UpdateOne
+from app.embeddings.embed_text import embed_text_batch
+from app.db.redis_client import redis_async, redis_sync
+from app.redis_index import VECTOR_TYPE, to_index_vector
+from app.rag.retrievers import invalidate_retrieval_cache, rebuild_known_cities
+from app.db.patch_add_city_keys import CITY_FIELDS, backfill_city_keys
+from app.utils.text import city_key
 from motor.motor_asyncio import AsyncIOMotorCollection
 
-# Synchronous Redis connection
-r_sync = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
+# Shared Redis pools: sync for index admin, async for the embedding writes
+r_sync = redis_sync
+
+# Docs per embed call / Mongo bulk_write / Redis pipeline
+EMBED_BATCH_SIZE = 128
+# Docs per Mongo getMore: two embed batches per network round-trip
+CURSOR_BATCH_SIZE = 256
+EMBED_TEXT_FIELDS = (
+    "hotelName", "name", "description", "route",
+    "category", "type", "cityName", "destination",
+)
+REDIS_META_FIELDS = (
+    "hotelName", "name", "cityName", "route",
+    "price", "rating", "category", "type",
+)
 
 
 def ensure_vector_index(index_name: str, prefix: str, vector_field: str, dim: int):
@@ -23,7 +44,7 @@ def ensure_vector_index(index_name: str, prefix: str, vector_field: str, dim: in
         "ON", "HASH", "PREFIX", "1", f"{prefix}:",
         "SCHEMA",
         vector_field, "VECTOR", "HNSW", "6",
-        "TYPE", "FLOAT32", "DIM", str(dim), "DISTANCE_METRIC", "COSINE",
+        "TYPE", VECTOR_TYPE, "DIM", str(dim), "DISTANCE_METRIC", "COSINE",
         "name", "TEXT",
         "description", "TEXT",
         "cityName", "TEXT",
@@ -57,51 +78,95 @@ async def ensure_embeddings_for_collection(
     """
     print(f"🔍 Checking embeddings for collection '{collection.name}'...")
 
-    cursor = collection.find({"embedding": {"$exists": False}})
+    # Docs seeded before the `<field>_lc` keys existed: the retriever fallbacks
+    # and the known-city set only see patched docs
+    if collection.name in CITY_FIELDS:
+        try:
+            await backfill_city_keys(collection, CITY_FIELDS[collection.name])
+        except Exception as e:
+            print(f"⚠️ Could not backfill city keys for {collection.name}: {e}")
+
+    # Known-city set lets retrievers skip Mongo for cities with no data
+    try:
+        await rebuild_known_cities(collection)
+    except Exception as e:
+        print(f"⚠️ Could not rebuild known cities for {collection.name}: {e}")
+
+    # Cheap guard: on warm restarts nothing is missing, so skip the scan
+    if await collection.count_documents({"embedding": {"$exists": False}}, limit=1) == 0:
+        print(f"👍 All documents in {collection.name} already have embeddings.")
+        return
+
     count_new = 0
+    city_fields = CITY_FIELDS.get(collection.name, ())
+    # Only what the embedding text, the Redis hash and the city keys are built from
+    projection = dict.fromkeys(("id", "hotelId", *EMBED_TEXT_FIELDS, *REDIS_META_FIELDS, *city_fields), 1)
+    cursor = collection.find({"embedding": {"$exists": False}}, projection).batch_size(CURSOR_BATCH_SIZE)
+    batch: List[Tuple[dict, str]] = []
+
+    async def flush() -> int:
+        """Embed, write to Mongo and sync to Redis one buffered batch at a time."""
+        docs, texts = zip(*batch)
+        batch.clear()
+        try:
+            # One batched embed call: cached float32 bytes per text
+            vectors = embed_text_batch(list(texts))
+        except Exception as e:
+            print(f"⚠️ Skipped {len(docs)} {collection.name} docs — embedding failed: {e}")
+            return 0
+
+        ops = []
+        pipe = redis_async.pipeline(transaction=False)
+        for doc, vec_bytes in zip(docs, vectors):
+            # Mongo: raw float32 bytes (read back with np.frombuffer), plus the
+            # normalized `<field>_lc` keys the retriever fallbacks match on
+            update = {"embedding": Binary(vec_bytes)}
+            for field in city_fields:
+                if isinstance(doc.get(field), str):
+                    update[f"{field}_lc"] = city_key(doc[field])
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+
+            # Redis hash: vector + basic metadata (only if exists)
+            redis_key = f"{prefix}:{doc.get('hotelId') or doc.get('id') or str(doc['_id'])}"
+            data = {vector_field: to_index_vector(vec_bytes)}
+            for field in REDIS_META_FIELDS:
+                if doc.get(field):
+                    data[field] = str(doc[field])
+            pipe.hset(redis_key, mapping=data)
+
+        try:
+            # Mongo and Redis writes overlap; neither blocks the event loop
+            await asyncio.gather(collection.bulk_write(ops, ordered=False), pipe.execute())
+        except Exception as e:
+            print(f"⚠️ Failed to write {len(ops)} {collection.name} embeddings — {e}")
+            return 0
+        return len(ops)
 
     async for doc in cursor:
         # Dynamically choose text fields to embed
-        possible_fields = [
-            "hotelName", "name", "description", "route",
-            "category", "type", "cityName", "destination"
-        ]
-        text_parts = [str(doc.get(f, "")) for f in possible_fields if doc.get(f)]
+        text_parts = [str(doc.get(f, "")) for f in EMBED_TEXT_FIELDS if doc.get(f)]
         text = " ".join(text_parts).strip()
 
         if not text:
             continue  # skip empty docs
 
-        try:
-            vec = embed_text(text)
-            if vec is None:
-                continue
-
-            # Update Mongo
-            await collection.update_one(
-                {"_id": doc["_id"]},
-                {"$set": {"embedding": vec.tolist()}},
-            )
+        batch.append((doc, text))
+        if len(batch) >= EMBED_BATCH_SIZE:
+            count_new += await flush()
 
-            # Prepare Redis hash data
-            redis_key = f"{prefix}:{doc.get('hotelId') or doc.get('id') or str(doc['_id'])}"
-            data = {vector_field: np.array(vec, dtype=np.float32).tobytes()}
-
-            # Include basic metadata (only if exists)
-            for field in [
-                "hotelName", "name", "cityName", "route",
-                "price", "rating", "category", "type"
-            ]:
-                if doc.get(field):
-                    data[field] = str(doc[field])
-
-            r_sync.hset(redis_key, mapping=data)
-            count_new += 1
-
-        except Exception as e:
-            print(f"⚠️ Skipped {collection.name} doc {doc.get('_id')} — {e}")
+    if batch:
+        count_new += await flush()
 
     if count_new:
         print(f"✅ Added {count_new} new embeddings for {collection.name}.")
+        # Cached retrievals may now be missing the new documents (or cities)
+        try:
+            await invalidate_retrieval_cache()
+        except Exception as e:
+            print(f"⚠️ Failed to invalidate retrieval cache for {collection.name} — {e}")
+        try:
+            await rebuild_known_cities(collection)
+        except Exception as e:
+            print(f"⚠️ Could not rebuild known cities for {collection.name}: {e}")
     else:
         print(f"👍 All documents in {collection.name} already have embeddings.")
@@ -1,8 +1,12 @@
 # -------------------------------------------------------------
 # Redis Index Management (robust: client + server checks)
 # -------------------------------------------------------------
-import redis
+import asyncio
+from functools import lru_cache
+import numpy as np
+import redis.asyncio as aioredis
 from app.config import settings
+from app.db.redis_client import redis_async
 
 # ---------- Client-side availability (redis-py RediSearch) ----------
 try:
@@ -29,11 +33,37 @@ EMB_TRANSPORT = "embedding"
 # if it uses text-embedding-3-small or text-embedding-ada-002, this is 1536.
 EMB_DIM = 1536
 
+# Vector element type in Redis (see settings.VECTOR_TYPE)
+_VECTOR_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16}
+VECTOR_TYPE = settings.VECTOR_TYPE
+if VECTOR_TYPE not in _VECTOR_DTYPES:
+    raise ValueError(f"Unsupported VECTOR_TYPE {VECTOR_TYPE!r}; use one of {sorted(_VECTOR_DTYPES)}")
+VECTOR_DTYPE = _VECTOR_DTYPES[VECTOR_TYPE]
+
+
+@lru_cache(maxsize=4096)
+def _downcast_vector(vec: bytes) -> bytes:
+    return np.frombuffer(vec, dtype=np.float32).astype(VECTOR_DTYPE).tobytes()
+
+
+def to_index_vector(vec: bytes) -> bytes:
+    """
+    float32 embedding bytes → the bytes the Redis vector fields store / are
+    queried with. Identity for FLOAT32 (the default).
+    """
+    return vec if VECTOR_DTYPE is np.float32 else _downcast_vector(vec)
+
 IDX_HOTELS       = "idx:hotels"
 IDX_ATTRACTIONS  = "idx:attractions"
 IDX_EVENTS       = "idx:events"
 IDX_FLIGHTS      = "idx:flights"
 IDX_TRANSPORTS   = "idx:transports"
+# Versioned: the request-scope fields were added later, and an existing index
+# is never altered by _create_index
+IDX_ITINERARY_CACHE = "idx:itinerary_cache:v2"
+
+# Vector field used by the itinerary narrative (semantic) cache
+EMB_ITINERARY_CACHE = "emb"
 
 PREFIX_MAP = {
     IDX_HOTELS: "hotel:",
@@ -41,21 +71,39 @@ PREFIX_MAP = {
     IDX_EVENTS: "event:",
     IDX_FLIGHTS: "flight:",
     IDX_TRANSPORTS: "transport:",
+    IDX_ITINERARY_CACHE: "itcache:",
 }
 
 
 # ---------- Helpers ----------
-def get_redis_client() -> redis.Redis:
-    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
+def get_redis_client() -> aioredis.Redis:
+    return redis_async
+
 
+# Positive probe results by connection pool: a loaded module doesn't go away,
+# so ensure_all_indexes and the six index builders share one MODULE LIST
+_SEARCH_PROBE: dict[int, tuple[bool, str | None]] = {}
 
-def server_has_redisearch(client: redis.Redis) -> tuple[bool, str | None]:
+
+async def server_has_redisearch(client: aioredis.Redis) -> tuple[bool, str | None]:
     """
     Check the Redis server for the RediSearch module via MODULE LIST.
-    Returns (has_search, version_str|None).
+    Returns (has_search, version_str|None). A positive answer is memoized
+    per connection pool; negative ones are re-probed (module may load later).
     """
+    pool_id = id(client.connection_pool)
+    cached = _SEARCH_PROBE.get(pool_id)
+    if cached is not None:
+        return cached
+    result = await _probe_redisearch(client)
+    if result[0]:
+        _SEARCH_PROBE[pool_id] = result
+    return result
+
+
+async def _probe_redisearch(client: aioredis.Redis) -> tuple[bool, str | None]:
     try:
-        modules = client.execute_command("MODULE", "LIST")
+        modules = await client.execute_command("MODULE", "LIST")
         # Handle both dict-style and list-style module metadata
         for m in modules:
             if isinstance(m, dict):
@@ -79,7 +127,7 @@ def server_has_redisearch(client: redis.Redis) -> tuple[bool, str | None]:
         return False, None
 
 
-def _create_index(client: redis.Redis, index_name: str, prefix: str, schema):
+async def _create_index(client: aioredis.Redis, index_name: str, prefix: str, schema):
     """
     Create a single RediSearch index if it does not already exist.
     Uses redis-py search API (client.ft(index_name)).
@@ -89,26 +137,46 @@ def _create_index(client: redis.Redis, index_name: str, prefix: str, schema):
         print(f"Skip {index_name}: redis-py RediSearch client not installed.")
         return
 
-    # Guard on server-side module
-    has_search, ver = server_has_redisearch(client)
+    # Guard on server-side module (memoized, see server_has_redisearch)
+    has_search, _ = await server_has_redisearch(client)
     if not has_search:
         print(f"Skip {index_name}: Redis server missing RediSearch module.")
         return
 
     try:
-        client.ft(index_name).info()
+        await client.ft(index_name).info()
         print(f"Index '{index_name}' already exists.")
     except Exception:
         try:
             definition = IndexDefinition(prefix=[prefix], index_type=IndexType.HASH)
-            client.ft(index_name).create_index(schema, definition=definition)
+            await client.ft(index_name).create_index(schema, definition=definition)
             print(f"Created index: {index_name}")
         except Exception as e:
             print(f"Failed to create index '{index_name}': {e}")
 
 
+# HNSW graph parameters for every vector field. FLAT (brute force) ignores
+# EF_RUNTIME and degrades at larger K; queries tune recall via EF_RUNTIME.
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+
+
+def _vector_field(name: str):
+    return VectorField(
+        name,
+        "HNSW",
+        {
+            "TYPE": VECTOR_TYPE,
+            "DIM": EMB_DIM,
+            "DISTANCE_METRIC": "COSINE",
+            "M": HNSW_M,
+            "EF_CONSTRUCTION": HNSW_EF_CONSTRUCTION,
+        },
+    )
+
+
 # ---------- Individual index builders ----------
-def ensure_hotel_index(client: redis.Redis):
+async def ensure_hotel_index(client: aioredis.Redis):
     if not CLIENT_HAS_REDISEARCH:
         print("Skipping hotel index — redis-py RediSearch client not installed.")
         return
@@ -119,20 +187,12 @@ def ensure_hotel_index(client: redis.Redis):
         NumericField("price"),
         NumericField("rating"),
         TextField("description"),
-        VectorField(
-            "embedding",
-            "FLAT",
-            {
-                "TYPE": "FLOAT32",
-                "DIM": EMB_DIM,
-                "DISTANCE_METRIC": "COSINE",
-            },
-        ),
+        _vector_field("embedding"),
     ]
-    _create_index(client, IDX_HOTELS, PREFIX_MAP[IDX_HOTELS], schema)
+    await _create_index(client, IDX_HOTELS, PREFIX_MAP[IDX_HOTELS], schema)
 
 
-def ensure_attraction_index(client: redis.Redis):
+async def ensure_attraction_index(client: aioredis.Redis):
     if not CLIENT_HAS_REDISEARCH:
         print("Skipping attraction index — redis-py RediSearch client not installed.")
         return
@@ -144,20 +204,12 @@ def ensure_attraction_index(client: redis.Redis):
         NumericField("entry_fee"),
         TextField("opening_hours"),
         NumericField("rating"),
-        VectorField(
-            "embedding",
-            "FLAT",
-            {
-                "TYPE": "FLOAT32",
-                "DIM": EMB_DIM,
-                "DISTANCE_METRIC": "COSINE",
-            },
-        ),
+        _vector_field("embedding"),
     ]
-    _create_index(client, IDX_ATTRACTIONS, PREFIX_MAP[IDX_ATTRACTIONS], schema)
+    await _create_index(client, IDX_ATTRACTIONS, PREFIX_MAP[IDX_ATTRACTIONS], schema)
 
 
-def ensure_event_index(client: redis.Redis):
+async def ensure_event_index(client: aioredis.Redis):
     if not CLIENT_HAS_REDISEARCH:
         print("Skipping event index — redis-py RediSearch client not installed.")
         return
@@ -168,20 +220,12 @@ def ensure_event_index(client: redis.Redis):
         TextField("type"),
         TextField("date"),
         TextField("description"),
-        VectorField(
-            "embedding",
-            "FLAT",
-            {
-                "TYPE": "FLOAT32",
-                "DIM": EMB_DIM,
-                "DISTANCE_METRIC": "COSINE",
-            },
-        ),
+        _vector_field("embedding"),
     ]
-    _create_index(client, IDX_EVENTS, PREFIX_MAP[IDX_EVENTS], schema)
+    await _create_index(client, IDX_EVENTS, PREFIX_MAP[IDX_EVENTS], schema)
 
 
-def ensure_flight_index(client: redis.Redis):
+async def ensure_flight_index(client: aioredis.Redis):
     if not CLIENT_HAS_REDISEARCH:
         print("Skipping flight index — redis-py RediSearch client not installed.")
         return
@@ -190,22 +234,14 @@ def ensure_flight_index(client: redis.Redis):
         TagField("origin"),
         TagField("destination"),
         TextField("airline"),
-        NumericField("price"),
+        NumericField("price", sortable=True),  # cheapest-flight SORTBY
         TextField("duration"),
-        VectorField(
-            "embedding",
-            "FLAT",
-            {
-                "TYPE": "FLOAT32",
-                "DIM": EMB_DIM,
-                "DISTANCE_METRIC": "COSINE",
-            },
-        ),
+        _vector_field("embedding"),
     ]
-    _create_index(client, IDX_FLIGHTS, PREFIX_MAP[IDX_FLIGHTS], schema)
+    await _create_index(client, IDX_FLIGHTS, PREFIX_MAP[IDX_FLIGHTS], schema)
 
 
-def ensure_transport_index(client: redis.Redis):
+async def ensure_transport_index(client: aioredis.Redis):
     if not CLIENT_HAS_REDISEARCH:
         print("Skipping transport index — redis-py RediSearch client not installed.")
         return
@@ -214,25 +250,33 @@ def ensure_transport_index(client: redis.Redis):
         TagField("cityName"),
         TextField("name"),
         TextField("type"),
-        NumericField("price"),
+        NumericField("price", sortable=True),  # cheapest-transport SORTBY
         TextField("description"),
-        VectorField(
-            "embedding",
-            "FLAT",
-            {
-                "TYPE": "FLOAT32",
-                "DIM": EMB_DIM,
-                "DISTANCE_METRIC": "COSINE",
-            },
-        ),
+        _vector_field("embedding"),
     ]
-    _create_index(client, IDX_TRANSPORTS, PREFIX_MAP[IDX_TRANSPORTS], schema)
+    await _create_index(client, IDX_TRANSPORTS, PREFIX_MAP[IDX_TRANSPORTS], schema)
+
+
+async def ensure_itinerary_cache_index(client: aioredis.Redis):
+    if not CLIENT_HAS_REDISEARCH:
+        print("Skipping itinerary cache index — redis-py RediSearch client not installed.")
+        return
+
+    # The request embedding plus the scope a hit must match exactly; the
+    # cached response is a plain hash field
+    schema = [
+        TagField("city"),
+        NumericField("days"),
+        NumericField("budget_band"),
+        _vector_field(EMB_ITINERARY_CACHE),
+    ]
+    await _create_index(client, IDX_ITINERARY_CACHE, PREFIX_MAP[IDX_ITINERARY_CACHE], schema)
 
 
 # ---------- One-call helper for main.py ----------
-def ensure_all_indexes(client: redis.Redis):
+async def ensure_all_indexes(client: aioredis.Redis):
     has_search_client = CLIENT_HAS_REDISEARCH
-    has_search_server, ver = server_has_redisearch(client)
+    has_search_server, ver = await server_has_redisearch(client)
 
     print("-----------------------------------------------------")
     print("Redis Vector Index System")
@@ -248,8 +292,11 @@ def ensure_all_indexes(client: redis.Redis):
         print("Skipping all index creations — RediSearch not fully available.")
         return
 
-    ensure_hotel_index(client)
-    ensure_attraction_index(client)
-    ensure_event_index(client)
-    ensure_flight_index(client)
-    ensure_transport_index(client)
+    await asyncio.gather(
+        ensure_hotel_index(client),
+        ensure_attraction_index(client),
+        ensure_event_index(client),
+        ensure_flight_index(client),
+        ensure_transport_index(client),
+        ensure_itinerary_cache_index(client),
+    )
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from typing import Any, List, Optional, TypedDict
 from datetime import date, datetime
-import uuid
+import secrets
 
 
 # ============================================================
@@ -121,7 +121,7 @@ class TripCostSchema(BaseModel):
 # 🧳 Final Itinerary Schema (response)
 # ============================================================
 class ItinerarySchema(BaseModel):
-    trip_id: str = Field(default_factory=lambda: f"TRIP-{uuid.uuid4().hex[:8].upper()}")
+    trip_id: str = Field(default_factory=lambda: f"TRIP-{secrets.token_hex(4).upper()}")
     summary_text: str
     highlights: List[str] = Field(default_factory=list)
     days: List[DayPlanSchema]
@@ -129,6 +129,64 @@ class ItinerarySchema(BaseModel):
     assumptions: List[str] = Field(default_factory=list)
 
 
+# ============================================================
+# 📥 Retriever doc shapes (plain dicts returned by retrieve_*)
+# ============================================================
+# Static types only: the mappers in app/rag/retrievers.py build these dicts
+# directly, so there is no per-document validation pass at runtime.
+class HotelDoc(TypedDict):
+    id: str
+    hotelId: Optional[str]
+    hotelName: Optional[str]
+    cityName: Optional[str]
+    price: float
+    rating: float
+    source: str
+
+
+class AttractionDoc(TypedDict):
+    id: str
+    name: Optional[str]
+    cityName: Optional[str]
+    category: Optional[str]
+    entry_fee: float
+    duration_min: int
+    rating: float
+    source: str
+
+
+class EventDoc(TypedDict):
+    id: str
+    name: Optional[str]
+    cityName: Optional[str]
+    type: Optional[str]
+    date: Any
+    source: str
+
+
+# "from" is a keyword: functional syntax
+FlightDoc = TypedDict("FlightDoc", {
+    "id": str,
+    "airline": Optional[str],
+    "flight_number": Optional[str],
+    "from": Optional[str],
+    "to": Optional[str],
+    "price": float,
+    "duration": Any,
+    "source": str,
+})
+
+
+class TransportDoc(TypedDict):
+    id: str
+    mode: Optional[str]
+    provider: str
+    from_city: Optional[str]
+    to_city: Optional[str]
+    price: float
+    source: str
+
+
 # ============================================================
 # 🧩 Aliases for Backward Compatibility
 # ============================================================
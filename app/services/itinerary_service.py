@@ -1,6 +1,7 @@
-import uuid
-import random
+import asyncio
+import secrets
 from typing import List, Set
+import numpy as np
 from app.models.itinerary_models import (
     TravelerPrefs,
     Itinerary,
@@ -11,12 +12,22 @@ from app.models.itinerary_models import (
     FlightSegment,
     TransportSegment,
 )
+from app.rag.redis_vectorstores import (
+    prepare_itinerary_vectors,
+    plan_hotels,
+    plan_attractions,
+    plan_events,
+    plan_cheapest_flight,
+    plan_cheapest_transport,
+)
 from app.rag.retrievers import (
     retrieve_hotels,
     retrieve_attractions,
     retrieve_events,
-    retrieve_flights,
-    retrieve_transports,
+    retrieve_cheapest_flight,
+    retrieve_cheapest_transport,
+    retrieve_many,
+    retrieval_scope,
 )
 from app.planner.budget_splitter import split_budget
 from app.planner.rule_based_planner import pick_hotel, build_day
@@ -26,9 +37,24 @@ from app.rag.langchain_pipeline.itinerary_chain import generate_ai_itinerary_nar
 # ------------------------------------------------------------------
 # 🧠 Helper — smart daily activity selection with uniqueness
 # ------------------------------------------------------------------
+def activity_candidates(docs: List[dict], interests: List[str]) -> List[tuple]:
+    """
+    Score a city's attractions + events once: (ratio, fee, category, id, doc),
+    where ratio = value / max(fee, 1) and value is 1, plus 1 when the
+    category matches an interest.
+    """
+    wanted = {i.casefold() for i in interests or ()}
+    out = []
+    for doc in docs:
+        category = doc.get("category") or doc.get("type") or "general"
+        fee = float(doc.get("entry_fee", 0) or doc.get("price", 0) or 0)
+        value = 1.0 + (category.casefold() in wanted)
+        out.append((value / max(fee, 1.0), fee, category, str(doc.get("id")), doc))
+    return out
+
+
 def pick_unique_activities(
-    attr_docs: List[dict],
-    event_docs: List[dict],
+    candidates: List[tuple],
     daily_budget: float,
     day_number: int,
     used_ids: Set[str],
@@ -36,42 +62,43 @@ def pick_unique_activities(
 ) -> List[Activity]:
     """
     Select daily activities with diversity and budget control.
-    - Combines attractions + events
+    - `candidates` come from activity_candidates, built once per city
+    - Best value per cost first (cheaper, then a per-day shuffle, breaks ties)
     - Avoids repeating the same IDs
     - Ensures varied categories per day
     """
-    from app.models.itinerary_models import Activity
-
-    pool = []
-    pool.extend(attr_docs)
-    pool.extend(event_docs or [])
-
-    if not pool:
+    if not candidates:
+        return []
+    # Nothing affordable (free activities still fit a zero budget): skip the sort
+    min_fee = min(c[1] for c in candidates)
+    if min_fee > daily_budget:
         return []
+    slots = min(slots, len(candidates))
 
-    random.seed(day_number)
-    random.shuffle(pool)
+    # Deterministic per-day tie-breaker, so equal-value days still vary
+    tie = np.random.default_rng(day_number).permutation(len(candidates)).tolist()
+    order = sorted(range(len(candidates)), key=lambda i: (-candidates[i][0], candidates[i][1], tie[i]))
 
     picked, total, categories = [], 0.0, set()
-    for doc in pool:
-        doc_id = str(doc.get("id"))
+    for i in order:
+        _, fee, category, doc_id, doc = candidates[i]
         if doc_id in used_ids:
             continue
-        category = doc.get("category") or doc.get("type") or "general"
-        fee = float(doc.get("entry_fee", 0) or doc.get("price", 0) or 0)
 
         # skip if duplicate category or over budget
         if category in categories or total + fee > daily_budget:
             continue
 
+        # Retriever output is already mapped: skip per-field validation, but
+        # keep the two coercions validation used to do
         picked.append(
-            Activity(
+            Activity.model_construct(
                 id=doc_id,
                 name=doc.get("name"),
                 city=doc.get("cityName"),
                 category=category,
                 entry_fee=fee,
-                duration_min=doc.get("duration_min", 120),
+                duration_min=int(doc.get("duration_min", 120) or 120),
                 opening_hours=doc.get("opening_hours"),
                 best_time_hint=doc.get("best_time_hint", "Morning"),
                 source=doc.get("source", "mongo"),
@@ -81,17 +108,100 @@ def pick_unique_activities(
         categories.add(category)
         total += fee
 
-        if len(picked) >= slots:
+        # Done once the slots are full or nothing left could fit the budget
+        if len(picked) >= slots or total + min_fee > daily_budget:
             break
 
     return picked
 
 
+# ------------------------------------------------------------------
+# 🔎 Per-city retrieval (cache MGET, one pipelined search round-trip)
+# ------------------------------------------------------------------
+async def _retrieve_city(prefs: TravelerPrefs, idx: int, max_price: float, max_fee: float):
+    """
+    Hotels, attractions (entry fee within `max_fee`), events, the cheapest
+    transport and the inbound flight for one city.
+    """
+    city = prefs.destination[idx]
+    prev_city = prefs.origin if idx == 0 else prefs.destination[idx - 1]
+    start_iso, end_iso = prefs.start_date.isoformat(), prefs.end_date.isoformat()
+
+    # The four query vectors are embedded in one batch, and only if some
+    # retrieval misses the cache
+    vecs = {}
+
+    def vec(name: str) -> bytes:
+        if not vecs:
+            vecs.update(prepare_itinerary_vectors(city, prefs.interests, max_price, start_iso, end_iso))
+        return vecs[name]
+
+    # ✈️ Inbound leg, plus the return leg for the last city. Each hop is the
+    # next city's inbound, so the hop / return lookups later are memo hits.
+    flight_legs = [(prev_city, city)]
+    if idx == len(prefs.destination) - 1:
+        flight_legs.append((city, prefs.origin))
+
+    # Cached retrievals in one MGET; the misses (flights included) in one
+    # pipelined search round-trip, with their fallbacks run concurrently.
+    # A return leg (last city) is only memoized here, so just the inbound
+    # flight is handed back.
+    results = await retrieve_many([
+        (retrieve_hotels, lambda: plan_hotels(city, max_price, k=8, vec_bytes=vec("hotels")),
+         (city,), {"max_price": max_price, "k": 8}),
+        (retrieve_attractions,
+         lambda: plan_attractions(city, prefs.interests, k=20, vec_bytes=vec("attractions"), max_fee=max_fee),
+         (city, prefs.interests), {"k": 20, "max_fee": max_fee}),
+        (retrieve_events, lambda: plan_events(city, start_iso, end_iso, k=10, vec_bytes=vec("events")),
+         (city, start_iso, end_iso), {"k": 10}),
+        (retrieve_cheapest_transport, lambda: plan_cheapest_transport(city), (city,), {}),
+        *((retrieve_cheapest_flight, lambda a=a, b=b: plan_cheapest_flight(a, b), (a, b), {})
+          for a, b in flight_legs),
+    ])
+    return tuple(results[:5])
+
+
+# ------------------------------------------------------------------
+# 🧩 AI narrative (needs only the prefs, so it overlaps retrieval)
+# ------------------------------------------------------------------
+async def _narrative(prefs: TravelerPrefs, total_days: int):
+    """(summary_text, highlights, assumptions); never raises."""
+    try:
+        ai_summary = await asyncio.to_thread(
+            generate_ai_itinerary_narrative,
+            origin=prefs.origin,
+            destination=", ".join(prefs.destination),
+            start_date=prefs.start_date.isoformat(),
+            end_date=prefs.end_date.isoformat(),
+            traveler_type=prefs.traveler_type,
+            budget_total=prefs.budget_total,
+            interests=prefs.interests,
+            context="Multi-city travel plan with unique daily experiences and event blending.",
+        )
+        summary_text = ai_summary.get("summary_text", f"{total_days}-day trip across {', '.join(prefs.destination)}.")
+        highlights = ai_summary.get("highlights", [])
+        assumptions = [ai_summary.get("ai_commentary", "Generated via AI summarization.")]
+    except Exception as e:
+        summary_text = f"{total_days}-day trip covering {', '.join(prefs.destination)}."
+        highlights = ["AI summary unavailable — using fallback description."]
+        assumptions = [f"AI summary generation failed: {str(e)}"]
+    return summary_text, highlights, assumptions
+
+
 # ------------------------------------------------------------------
 # 🚀 Core Service: Build Multi-City Itinerary
+# Segments and day plans are shaped here from trusted data, so they use
+# model_construct (no per-field validation); the response model still
+# validates at the API boundary.
 # ------------------------------------------------------------------
 async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
     """Builds a full multi-city itinerary with hotels, flights, and daily plans."""
+    # Repeated lookups (same city / flight pair) are fetched once per build
+    with retrieval_scope():
+        return await _build_itinerary(prefs)
+
+
+async def _build_itinerary(prefs: TravelerPrefs) -> Itinerary:
 
     total_days = (prefs.end_date - prefs.start_date).days + 1
     if total_days <= 0:
@@ -105,90 +215,81 @@ async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
     costs = split_budget(prefs.budget_total)
     daily_budget = costs.activities_total / total_days
 
+    # 🧩 The LLM narrative runs in a worker thread while the cities are retrieved
+    narrative_task = asyncio.create_task(_narrative(prefs, total_days))
+
     all_days: List[DayPlan] = []
     current_day_index = 1
     used_activity_ids: Set[str] = set()
 
     hotel_total = 0
-    activities_total = 0
+    day_activity_fees: List[float] = []  # one entry per planned day, summed once at the end
     transport_total = 0
     flights_total = 0
 
-    # 🏙️ Loop through cities
+    # 🏙️ Every city's retrieval runs concurrently; assembly below stays
+    # sequential (activity uniqueness and day numbering depend on order)
+    max_price = costs.hotel_total / total_days
+    city_data = await asyncio.gather(
+        *(_retrieve_city(prefs, idx, max_price, daily_budget) for idx in range(num_cities))
+    )
+
     for idx, city in enumerate(prefs.destination):
         city_days = max(1, total_days // num_cities + (1 if idx < total_days % num_cities else 0))
-
-        # 1️⃣ Retrieve data
-        hotel_docs = await retrieve_hotels(city, max_price=costs.hotel_total / total_days, k=8)
-        attr_docs = await retrieve_attractions(city, prefs.interests, k=20)
-        event_docs = await retrieve_events(city, prefs.start_date.isoformat(), prefs.end_date.isoformat(), k=10)
-        transport_docs = await retrieve_transports(city, k=5)
+        hotel_docs, attr_docs, event_docs, best_transport, best_inbound = city_data[idx]
 
         hotel = pick_hotel(hotel_docs, city_days, costs.hotel_total)
         if not hotel:
             continue
 
-        best_transport = min(transport_docs, key=lambda t: t.get("price", 999999), default=None)
-
-        # ✈️ Flight from previous city (or origin)
-        prev_city = prefs.origin if idx == 0 else prefs.destination[idx - 1]
-        inbound_flights = await retrieve_flights(prev_city, city)
-        best_inbound = min(inbound_flights, key=lambda f: f.get("price", 999999), default=None)
-
-        # 2️⃣ Generate daily plans for this city
+        # 2️⃣ Generate daily plans for this city (extended into all_days once)
+        city_pool = activity_candidates(attr_docs + (event_docs or []), prefs.interests)
+        city_plans: List[DayPlan] = []
+        # Mode / provider / price are the same for every local leg in this city
+        local_leg = best_transport and dict(
+            mode=best_transport.get("mode", "car"),
+            provider=best_transport.get("provider", "Local Transport"),
+            price=float(best_transport.get("price", 0)),
+        )
         for _ in range(city_days):
-            acts = pick_unique_activities(attr_docs, event_docs, daily_budget, current_day_index, used_activity_ids)
+            acts = pick_unique_activities(city_pool, daily_budget, current_day_index, used_activity_ids)
+            day_activity_fees.append(sum(a.entry_fee for a in acts))
             transport_segments: List[TransportSegment] = []
 
-            # 🚗 Local transport sequence
-            if best_transport and hotel and acts:
-                # hotel → each activity → hotel
-                for j, act in enumerate(acts):
-                    from_place = hotel.name if j == 0 else acts[j - 1].name
-                    to_place = act.name
-                    transport_segments.append(
-                        TransportSegment(
-                            mode=best_transport.get("mode", "car"),
-                            provider=best_transport.get("provider", "Local Transport"),
-                            from_place=from_place,
-                            to_place=to_place,
-                            price=float(best_transport.get("price", 0)),
-                        )
-                    )
-                transport_segments.append(
-                    TransportSegment(
-                        mode=best_transport.get("mode", "car"),
-                        provider=best_transport.get("provider", "Local Transport"),
-                        from_place=acts[-1].name,
-                        to_place=hotel.name,
-                        price=float(best_transport.get("price", 0)),
-                    )
-                )
-
-            # ✈️ Flight segment on first day in city
+            # ✈️ Flight segment on first day in city (airport transfer leads the day)
             flight_segment = None
             if current_day_index == 1 and best_inbound:
-                flight_segment = FlightSegment(
+                # Only the trip's first inbound flight is counted here; later
+                # inbound legs are the hop flights, counted on their travel day
+                flights_total += best_inbound.get("price", 0)
+                flight_segment = FlightSegment.model_construct(
                     airline=best_inbound.get("airline", "Unknown Airline"),
                     from_city=best_inbound.get("from"),
                     to_city=best_inbound.get("to"),
                     price=best_inbound.get("price", 0),
                     duration_minutes=best_inbound.get("duration_minutes", 0),
                 )
-                transport_segments.insert(
-                    0,
-                    TransportSegment(
+                transport_segments.append(
+                    TransportSegment.model_construct(
                         mode="car",
                         provider="Airport Transfer",
                         from_place=f"{best_inbound.get('to')} Airport",
                         to_place=hotel.name,
                         price=best_transport.get("price", 0) if best_transport else 100,
-                    ),
+                    )
+                )
+
+            # 🚗 Local transport sequence: hotel → each activity → hotel
+            if local_leg and acts:
+                stops = [hotel.name, *(a.name for a in acts), hotel.name]
+                transport_segments.extend(
+                    TransportSegment.model_construct(from_place=a, to_place=b, **local_leg)
+                    for a, b in zip(stops, stops[1:])
                 )
 
             # 🏨 Build the day's plan
-            all_days.append(
-                DayPlan(
+            city_plans.append(
+                DayPlan.model_construct(
                     day_index=current_day_index,
                     city=city,
                     hotel=hotel if _ == 0 else None,
@@ -204,18 +305,17 @@ async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
         # ✈️ Inter-city flight to next city
         if idx < num_cities - 1:
             next_city = prefs.destination[idx + 1]
-            hop_flights = await retrieve_flights(city, next_city)
-            if hop_flights:
-                best_hop = min(hop_flights, key=lambda f: f.get("price", 999999))
+            best_hop = await retrieve_cheapest_flight(city, next_city)
+            if best_hop:
                 flights_total += best_hop.get("price", 0)
-                all_days.append(
-                    DayPlan(
+                city_plans.append(
+                    DayPlan.model_construct(
                         day_index=current_day_index,
                         city=city,
                         hotel=None,
                         activities=[],
                         transport_segments=[],
-                        flight=FlightSegment(
+                        flight=FlightSegment.model_construct(
                             airline=best_hop.get("airline", "Local Airline"),
                             from_city=best_hop.get("from"),
                             to_city=best_hop.get("to"),
@@ -228,28 +328,26 @@ async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
                 )
                 current_day_index += 1
 
+        all_days.extend(city_plans)
+
         # 🧾 Totals
         hotel_total += hotel.price_per_night * city_days
-        activities_total += sum(a.entry_fee for a in acts)
         if best_transport:
             transport_total += best_transport.get("price", 0) * city_days * 3
-        if best_inbound:
-            flights_total += best_inbound.get("price", 0)
 
     # 🛫 Return flight (last city → origin)
     last_city = prefs.destination[-1]
-    return_flights = await retrieve_flights(last_city, prefs.origin)
-    if return_flights:
-        best_return = min(return_flights, key=lambda f: f.get("price", 999999))
+    best_return = await retrieve_cheapest_flight(last_city, prefs.origin)
+    if best_return:
         flights_total += best_return.get("price", 0)
         all_days.append(
-            DayPlan(
+            DayPlan.model_construct(
                 day_index=current_day_index,
                 city=last_city,
                 hotel=None,
                 activities=[],
                 transport_segments=[],
-                flight=FlightSegment(
+                flight=FlightSegment.model_construct(
                     airline=best_return.get("airline", "Return Airline"),
                     from_city=best_return.get("from"),
                     to_city=best_return.get("to"),
@@ -262,6 +360,7 @@ async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
         )
 
     # 💰 Cost summary
+    activities_total = sum(day_activity_fees)
     total_cost = hotel_total + activities_total + flights_total + transport_total
     cost_summary = TripCost(
         hotel_total=hotel_total,
@@ -271,29 +370,12 @@ async def build_itinerary(prefs: TravelerPrefs) -> Itinerary:
         total=total_cost,
     )
 
-    # 🧩 AI Narrative Summary
-    try:
-        ai_summary = generate_ai_itinerary_narrative(
-            origin=prefs.origin,
-            destination=", ".join(prefs.destination),
-            start_date=prefs.start_date.isoformat(),
-            end_date=prefs.end_date.isoformat(),
-            traveler_type=prefs.traveler_type,
-            budget_total=prefs.budget_total,
-            interests=prefs.interests,
-            context="Multi-city travel plan with unique daily experiences and event blending.",
-        )
-        summary_text = ai_summary.get("summary_text", f"{total_days}-day trip across {', '.join(prefs.destination)}.")
-        highlights = ai_summary.get("highlights", [])
-        assumptions = [ai_summary.get("ai_commentary", "Generated via AI summarization.")]
-    except Exception as e:
-        summary_text = f"{total_days}-day trip covering {', '.join(prefs.destination)}."
-        highlights = ["AI summary unavailable — using fallback description."]
-        assumptions = [f"AI summary generation failed: {str(e)}"]
+    # 🧩 AI Narrative Summary (started before retrieval, see above)
+    summary_text, highlights, assumptions = await narrative_task
 
     # 🎁 Final Itinerary
     return Itinerary(
-        trip_id=f"TRIP-{uuid.uuid4().hex[:8].upper()}",
+        trip_id=f"TRIP-{secrets.token_hex(4).upper()}",
         summary_text=summary_text,
         highlights=highlights,
         days=all_days,
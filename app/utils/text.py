@@ -0,0 +1,24 @@
+import re
+from functools import lru_cache
+
+from bson.regex import Regex
+
+
+@lru_cache(maxsize=4096)
+def city_key(value: str) -> str:
+    """
+    Normalized city key ("  Jeddah " -> "jeddah").
+    Stored denormalized as `<field>_lc` so Mongo lookups are indexed equality
+    matches instead of case-insensitive regex scans.
+    """
+    return (value or "").strip().lower()
+
+
+@lru_cache(maxsize=1024)
+def ci_exact(value: str) -> Regex:
+    """
+    Prebuilt case-insensitive whole-string BSON regex for `value`, with regex
+    metacharacters escaped (a city like "St. John's (Old)" matches literally).
+    Only for legacy documents that lack the `<field>_lc` key.
+    """
+    return Regex(f"^{re.escape((value or '').strip())}$", "i")
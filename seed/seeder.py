@@ -8,11 +8,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 async def main():
     db = get_mongo_client()
 
-    await ensure_embeddings_for_collection(db["hotels"], "idx:hotels", "hotel", "embedding", 384)
-    await ensure_embeddings_for_collection(db["attractions"], "idx:attractions", "attr", "embedding", 384)
-    await ensure_embeddings_for_collection(db["events"], "idx:events", "event", "embedding", 384)
-    await ensure_embeddings_for_collection(db["flights"], "idx:flights", "flight", "embedding", 384)
-    await ensure_embeddings_for_collection(db["transports"], "idx:transports", "transport", "embedding", 384)
+    # Independent collections / indexes: backfill them concurrently (as app/main.py warmup does)
+    await asyncio.gather(
+        ensure_embeddings_for_collection(db["hotels"], "idx:hotels", "hotel", "embedding", 384),
+        ensure_embeddings_for_collection(db["attractions"], "idx:attractions", "attr", "embedding", 384),
+        ensure_embeddings_for_collection(db["events"], "idx:events", "event", "embedding", 384),
+        ensure_embeddings_for_collection(db["flights"], "idx:flights", "flight", "embedding", 384),
+        ensure_embeddings_for_collection(db["transports"], "idx:transports", "transport", "embedding", 384),
+    )
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,3 +1,4 @@
+import array
 import asyncio
 import json
 import os
@@ -6,15 +7,22 @@ import numpy as np
 from datetime import datetime
 from bson import Binary, ObjectId
 import motor.motor_asyncio
-import redis.asyncio as aioredis
-import redis
+
+try:
+    import orjson
+    _loads = orjson.loads  # C-accelerated, parses the raw bytes directly
+except ImportError:  # stdlib fallback when orjson is not installed
+    _loads = json.loads
 
 
 # ----------------------------------------------------
 # Local Imports
 # ----------------------------------------------------
 from app.config import settings
-from app.embeddings.embed_text import embed_text
+from app.embeddings.embed_text import embed_text_batch
+from app.db.redis_client import redis_async
+from app.utils.text import city_key
+from app.rag.retrievers import invalidate_retrieval_cache, rebuild_known_cities
 from app.redis_index import (
     ensure_hotel_index,
     ensure_attraction_index,
@@ -22,6 +30,7 @@ from app.redis_index import (
     PFX_HOTEL, EMB_HOTEL,
     PFX_ATTR, EMB_ATTR,
     PFX_EVENT, EMB_EVENT,
+    to_index_vector,
 )
 
 # ----------------------------------------------------
@@ -51,35 +60,57 @@ print("----------------------------------------------------")
 # ----------------------------------------------------
 mongo_client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_URI)
 db = mongo_client[settings.MONGO_DB]
-redis_sync = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
-redis_async = aioredis.from_url(settings.REDIS_URL, decode_responses=False)
 
 # ----------------------------------------------------
 # Utilities
 # ----------------------------------------------------
+CITY_FIELDS = ("cityName", "from_city", "to_city", "origin", "destination")
+# Docs per insert_many / Redis pipeline; the next batch is prepared while
+# the previous one is being written
+SEED_BATCH_SIZE = 500
+
 def _vec_to_bytes(v):
-    if isinstance(v, list):
-        v = np.array(v, dtype=np.float32)
-    return v.astype(np.float32).tobytes()
+    if isinstance(v, np.ndarray):
+        # No copy when v is already a contiguous float32 ndarray
+        return np.ascontiguousarray(v, dtype=np.float32).tobytes()
+    if isinstance(v, (list, tuple)):
+        # Plain float list: packed straight to float32, no ndarray
+        return array.array("f", v).tobytes()
+    return bytes(v)
 
 def _load_json(file):
-    with open(file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def _convert_embedding(embedding_field, doc):
-    """Normalize or generate embeddings"""
-    emb = doc.get(embedding_field)
-    if emb is None:
-        # Generate embedding dynamically
-        text_fields = [doc.get("name"), doc.get("hotelName"),
-                       doc.get("description"), doc.get("cityName")]
-        combined = " ".join(filter(None, text_fields))
-        emb_vec = embed_text(combined)
-        return _vec_to_bytes(emb_vec)
-
-    if isinstance(emb, list):
-        return _vec_to_bytes(np.array(emb, dtype=np.float32))
+    with open(file, "rb") as f:
+        return _loads(f.read())
+
+def _embedding_text(doc):
+    text_fields = [doc.get("name"), doc.get("hotelName"),
+                   doc.get("description"), doc.get("cityName")]
+    return " ".join(filter(None, text_fields))
+
+def _convert_embeddings(embedding_field, data):
+    """
+    Normalize or generate embeddings for all docs at once: JSON float lists go
+    through one float32 matrix, missing embeddings through one batched embed call.
+    """
+    listed = [d for d in data if isinstance(d.get(embedding_field), list)]
+    if listed:
+        try:
+            mat = np.asarray([d[embedding_field] for d in listed], dtype=np.float32)
+        except ValueError:
+            mat = None  # ragged dims: convert row by row
+        for i, doc in enumerate(listed):
+            doc[embedding_field] = mat[i].tobytes() if mat is not None else _vec_to_bytes(doc[embedding_field])
 
+    missing = [d for d in data if d.get(embedding_field) is None]
+    if missing:
+        for doc, vec in zip(missing, embed_text_batch([_embedding_text(d) for d in missing])):
+            doc[embedding_field] = vec
+
+    for doc in data:
+        doc[embedding_field] = _convert_embedding(doc[embedding_field])
+
+def _convert_embedding(emb):
+    """Normalize an encoded (base64 / Binary) embedding to raw bytes"""
     if isinstance(emb, str):
         try:
             return base64.b64decode(emb)
@@ -92,9 +123,67 @@ def _convert_embedding(embedding_field, doc):
 
     return emb
 
+def _redis_mapping(doc, embedding_field=None):
+    """Redis hash mapping for a seeded doc (safe types only, plus the index vector)"""
+    mapping = {}
+    for k, v in doc.items():
+        if isinstance(v, (bytes, list, dict, Binary)):
+            continue
+        if isinstance(v, ObjectId):
+            v = str(v)
+        if isinstance(v, datetime):
+            v = v.isoformat()
+        mapping[k] = v
+
+    # Add embedding if present
+    if embedding_field and doc.get(embedding_field):
+        mapping[embedding_field] = to_index_vector(bytes(doc[embedding_field]))
+    return mapping
+
+def _prepare_docs(docs, embedding_field=None):
+    """Dates, normalized city keys and embeddings for a batch of seed docs (in place)"""
+    for doc in docs:
+        # Convert ISO dates to datetime
+        for k, v in list(doc.items()):
+            if isinstance(v, str) and v.endswith("Z"):
+                try:
+                    doc[k] = datetime.fromisoformat(v.replace("Z", "+00:00"))
+                except Exception:
+                    pass
+
+        # Normalized city keys for indexed equality lookups (no regex scans)
+        for field in CITY_FIELDS:
+            if isinstance(doc.get(field), str):
+                doc[f"{field}_lc"] = city_key(doc[field])
+
+    if embedding_field:
+        _convert_embeddings(embedding_field, docs)
+
+async def _write_batch(coll, docs, redis_prefix=None, embedding_field=None):
+    # Insert into MongoDB (one bulk round-trip; fills in each doc's _id)
+    await coll.insert_many(docs, ordered=False)
+
+    # Redis hashes for the batch in one pipelined round-trip
+    if redis_prefix:
+        mappings = [(f"{redis_prefix}{doc.get('id') or doc.get('hotelId')}", _redis_mapping(doc, embedding_field))
+                    for doc in docs]
+        async with redis_async.pipeline(transaction=False) as pipe:
+            for redis_key, mapping in mappings:
+                pipe.hset(redis_key, mapping=mapping)
+            await pipe.execute()
+
 # ----------------------------------------------------
 # Generic Seeder
 # ----------------------------------------------------
+async def _refresh_derived_caches(coll):
+    """The collection was replaced: known-city set and cached retrievals are stale."""
+    try:
+        await rebuild_known_cities(coll)
+        await invalidate_retrieval_cache()
+    except Exception as e:
+        print(f"⚠️ Could not refresh Redis caches for {coll.name}: {e}")
+
+
 async def seed_collection(name, file, coll_name,
                           redis_prefix=None, embedding_field=None,
                           ensure_index=None):
@@ -107,42 +196,23 @@ async def seed_collection(name, file, coll_name,
     await coll.delete_many({})
 
     if ensure_index:
-        ensure_index(redis_sync)
+        await ensure_index(redis_async)
 
-    for doc in data:
-        # Convert ISO dates to datetime
-        for k, v in list(doc.items()):
-            if isinstance(v, str) and v.endswith("Z"):
-                try:
-                    doc[k] = datetime.fromisoformat(v.replace("Z", "+00:00"))
-                except Exception:
-                    pass
-
-        if embedding_field:
-            doc[embedding_field] = _convert_embedding(embedding_field, doc)
-
-        # Insert into MongoDB
-        await coll.insert_one(doc)
-
-        # Prepare Redis mapping (safe types only)
-        if redis_prefix:
-            redis_key = f"{redis_prefix}{doc.get('id') or doc.get('hotelId')}"
-
-            mapping = {}
-            for k, v in doc.items():
-                if isinstance(v, (bytes, list, dict, Binary)):
-                    continue
-                if isinstance(v, ObjectId):
-                    v = str(v)
-                if isinstance(v, datetime):
-                    v = v.isoformat()
-                mapping[k] = v
-
-            # Add embedding if present
-            if embedding_field and doc.get(embedding_field):
-                mapping[embedding_field] = doc[embedding_field]
+    if not data:
+        print(f"⚠️ {file} is empty, skipping...")
+        await _refresh_derived_caches(coll)
+        return
 
-            await redis_async.hset(redis_key, mapping=mapping)
+    # Prepare (CPU, worker thread) batch i+1 while batch i is being written
+    pending = None
+    for start in range(0, len(data), SEED_BATCH_SIZE):
+        batch = data[start:start + SEED_BATCH_SIZE]
+        await asyncio.to_thread(_prepare_docs, batch, embedding_field)
+        if pending:
+            await pending
+        pending = asyncio.create_task(_write_batch(coll, batch, redis_prefix, embedding_field))
+    await pending
+    await _refresh_derived_caches(coll)
 
     print(f"✅ Seeded {len(data)} {name} from {file}")
 
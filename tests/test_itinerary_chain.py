@@ -0,0 +1,60 @@
+import re
+
+from app.rag.langchain_pipeline import itinerary_chain as chain_mod
+
+
+class FakeCacheRedis:
+    """Just the hash writes _cache_store pipelines."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hset(self, key, mapping):
+        self.hashes[key] = dict(mapping)
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        return []
+
+
+def _fake_knn(store):
+    """KNN over identical vectors (score 0): only the filter decides what matches."""
+
+    def knn(index, vector_field, vec_bytes, k, filter_str=None, return_fields=None, **kwargs):
+        tags = dict(re.findall(r"@(\w+):\{(\w+)\}", filter_str or ""))
+        ranges = {f: (float(lo), float(hi)) for f, lo, hi in re.findall(r"@(\w+):\[(\S+) (\S+)\]", filter_str or "")}
+        for h in store.hashes.values():
+            if all(h[f] == v for f, v in tags.items()) and all(lo <= h[f] <= hi for f, (lo, hi) in ranges.items()):
+                return [{"score": 0.0, "response": h["response"]}][:k]
+        return []
+
+    return knn
+
+
+def test_semantic_cache_hit_needs_same_city_days_and_budget_band(monkeypatch):
+    store = FakeCacheRedis()
+    calls = []
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(chain_mod, "r_sync", store)
+    monkeypatch.setattr(chain_mod, "_knn_query", _fake_knn(store))
+    monkeypatch.setattr(chain_mod, "embed_text_bytes", lambda text: b"\0" * 16)
+    monkeypatch.setattr(chain_mod, "_get_chain", lambda key: None)
+    monkeypatch.setattr(chain_mod, "_invoke_with_retry", lambda chain, data: calls.append(data) or '{"summary_text": "ok"}')
+
+    def narrate(end_date="2026-03-03", budget=2600):
+        return chain_mod.generate_ai_itinerary_narrative(
+            "Cairo", "Riyadh", "2026-03-01", end_date, "solo", budget, ["food"], "",
+        )
+
+    narrate()
+    narrate(budget=2900)                 # same budget band: served from cache
+    assert len(calls) == 1
+    narrate(end_date="2026-03-04")       # one more day
+    assert len(calls) == 2
+    narrate(budget=6000)                 # different budget band
+    assert len(calls) == 3
@@ -0,0 +1,57 @@
+import asyncio
+
+from app.db.patch_add_city_keys import backfill_city_keys
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, n):
+        return self
+
+    def __aiter__(self):
+        async def gen():
+            for d in self.docs:
+                yield d
+        return gen()
+
+
+class FakeResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeCollection:
+    """Motor stand-in holding plain dicts; applies $set updates by _id."""
+
+    name = "hotels"
+
+    def __init__(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+        self.indexes = []
+
+    def find(self, query, projection=None):
+        (field, cond), (lc_field, _) = query.items()
+        return FakeCursor([d for d in self.docs.values()
+                           if isinstance(d.get(field), str) and lc_field not in d])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.docs[op._filter["_id"]].update(op._doc["$set"])
+        return FakeResult(len(ops))
+
+    async def create_index(self, keys):
+        self.indexes.append(keys)
+
+
+def test_backfill_adds_missing_city_keys_only():
+    coll = FakeCollection([
+        {"_id": 1, "cityName": " Jeddah "},              # seeded before the _lc keys
+        {"_id": 2, "cityName": "Riyadh", "cityName_lc": "riyadh"},
+    ])
+
+    assert asyncio.run(backfill_city_keys(coll, ["cityName"])) == 1
+    assert coll.docs[1]["cityName_lc"] == "jeddah"
+    assert asyncio.run(backfill_city_keys(coll, ["cityName"])) == 0
+    assert coll.indexes[0] == "cityName_lc"
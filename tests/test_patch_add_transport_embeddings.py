@@ -0,0 +1,66 @@
+import asyncio
+
+import numpy as np
+
+from app.db import patch_add_transport_embeddings as patch
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, n):
+        return self
+
+    def __aiter__(self):
+        async def gen():
+            for d in self.docs:
+                yield d
+        return gen()
+
+
+class FakeResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeTransports:
+    """Records the write concern each bulk_write was sent with."""
+
+    def __init__(self, n, w=None, writes=None):
+        self.n, self.w = n, w
+        self.writes = writes if writes is not None else []
+
+    def find(self, query, projection=None):
+        return FakeCursor([{"_id": i, "mode": "bus"} for i in range(self.n)])
+
+    def with_options(self, write_concern):
+        return FakeTransports(self.n, write_concern.document.get("w"), self.writes)
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes.append((self.w, len(ops)))
+        return FakeResult(len(ops))
+
+    async def count_documents(self, query):
+        return 0
+
+
+def _run(monkeypatch, capsys, n, **kwargs):
+    coll = FakeTransports(n)
+    monkeypatch.setattr(patch, "BATCH_SIZE", 2)
+    monkeypatch.setattr(patch, "get_mongo_client", lambda: {"transports": coll})
+    monkeypatch.setattr(patch, "embed_texts", lambda texts: np.zeros((len(texts), 4), dtype=np.float32))
+    asyncio.run(patch.patch_transports(**kwargs))
+    return coll.writes, capsys.readouterr().out
+
+
+def test_writes_are_acknowledged_by_default(monkeypatch, capsys):
+    writes, out = _run(monkeypatch, capsys, 4)
+    assert writes == [(None, 2), (None, 2)]
+    assert "Added embeddings for 4 transport records" in out
+
+
+def test_unacknowledged_is_opt_in_and_makes_no_count_claim(monkeypatch, capsys):
+    writes, out = _run(monkeypatch, capsys, 4, unacknowledged=True)
+    assert writes == [(0, 2), (None, 2)]  # the last batch is acknowledged
+    assert "Added" not in out
@@ -0,0 +1,66 @@
+from redis.commands.search.result import Result
+
+from app.rag import redis_vectorstores as vs
+
+
+def _ft_reply(docs):
+    """Raw FT.SEARCH reply: [total, key, [field, value, ...], ...] (undecoded)."""
+    reply = [len(docs)]
+    for key, fields in docs:
+        reply.append(key.encode())
+        reply.append([x.encode() for kv in fields.items() for x in (kv[0], str(kv[1]))])
+    return reply
+
+
+class _FakeSearch:
+    def __init__(self, client, index):
+        self.client, self.index = client, index
+
+    def search(self, query, query_params=None):
+        self.client.calls.append((self.index, query, query_params))
+        return Result(self.client.reply, True)
+
+
+class FakeSyncRedis:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def ft(self, index):
+        return _FakeSearch(self, index)
+
+
+def test_long_exclusion_list_is_filtered_client_side(monkeypatch):
+    excluded = [f"A{i}" for i in range(vs.EXCLUDE_INLINE_MAX + 4)]
+    hits = [(f"attraction:{i}", {"name": i, "cityName": "Jeddah", "score": 0.1}) for i in excluded]
+    hits += [(f"attraction:B{i}", {"name": f"B{i}", "cityName": "Jeddah", "score": 0.2}) for i in range(5)]
+    fake = FakeSyncRedis(_ft_reply(hits))
+    monkeypatch.setattr(vs, "r_sync", fake)
+
+    docs = vs.search_attractions("Jeddah", ["museums"], k=3, exclude_ids=excluded, vec_bytes=b"\0" * 16)
+
+    (index, query, _), = fake.calls
+    assert index == vs.IDX_ATTRACTIONS
+    assert "-@id" not in query.query_string()  # no inline clauses for long lists
+    assert f"KNN {3 + len(excluded)} " in query.query_string()  # widened to survive the filter
+    assert [d["id"] for d in docs] == ["attraction:B0", "attraction:B1", "attraction:B2"]
+
+
+def test_short_exclusion_list_stays_inline(monkeypatch):
+    fake = FakeSyncRedis(_ft_reply([("attraction:B0", {"name": "B0", "score": 0.1})]))
+    monkeypatch.setattr(vs, "r_sync", fake)
+
+    docs = vs.search_attractions("Jeddah", [], k=3, exclude_ids=["A1"], vec_bytes=b"\0" * 16)
+
+    (_, query, _), = fake.calls
+    assert "-@id:{A1}" in query.query_string()
+    assert "KNN 3 " in query.query_string()
+    assert [d["id"] for d in docs] == ["attraction:B0"]
+
+
+def test_dedupe_uses_doc_key_for_description_fetch():
+    unique = vs._dedupe_experiences(
+        (vs.IDX_ATTRACTIONS, [{"id": "attraction:A1", "name": "Corniche"}]),
+        (vs.IDX_HOTELS, [{"id": "attraction:A1", "name": "dup"}, {"hotelId": "H7", "name": "Inn"}]),
+    )
+    assert [key for key, _ in unique] == ["attraction:A1", f"{vs.PREFIX_MAP[vs.IDX_HOTELS]}H7"]
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from app.rag import redis_vectorstores as vs
+from app.rag import retrievers
+
+from tests.test_redis_vectorstores import _ft_reply
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def execute_command(self, *args, **kwargs):
+        self.commands.append(args)
+        return self
+
+    async def execute(self, raise_on_error=True):
+        self.client.pipelined.extend(self.commands)
+        return [self.client.replies[args[1]] for args in self.commands]
+
+
+class FakeAsyncRedis:
+    """redis.asyncio stand-in: FT.SEARCH replies per index, an empty cache."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.pipelined = []
+        self.store = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+async def _no_fallback(*args, **kwargs):
+    raise AssertionError("Mongo fallback used for a Redis hit")
+
+
+def test_pipelined_retrieval_is_served_by_redis(monkeypatch):
+    fake = FakeAsyncRedis({
+        vs.IDX_HOTELS: _ft_reply([("hotel:H1", {"hotelName": "Red Sea Inn", "cityName": "Jeddah",
+                                                "price": 300, "rating": 4.5, "score": 0.1})]),
+    })
+    monkeypatch.setattr(vs, "redis_async", fake)
+    monkeypatch.setattr(retrievers, "redis_async", fake)
+    monkeypatch.setattr(retrievers, "_fallback_find", _no_fallback)
+
+    (hotels,) = asyncio.run(retrievers.retrieve_many([
+        (retrievers.retrieve_hotels,
+         lambda: vs.plan_hotels("Jeddah", 500, k=8, vec_bytes=b"\0" * 16),
+         ("Jeddah",), {"max_price": 500, "k": 8}),
+    ]))
+
+    (cmd,) = fake.pipelined
+    assert cmd[:2] == ("FT.SEARCH", vs.IDX_HOTELS)
+    assert "PARAMS" in cmd  # the query vector travels as $BLOB
+    assert [(h["id"], h["hotelName"], h["price"], h["rating"]) for h in hotels] == [
+        ("hotel:H1", "Red Sea Inn", 300.0, 4.5),
+    ]
+    assert fake.store, "mapped Redis hit is written to the retrieval cache"
+
+
+def test_asearch_many_parses_each_reply(monkeypatch):
+    fake = FakeAsyncRedis({
+        vs.IDX_FLIGHTS: _ft_reply([("flight:F1", {"airline": "Saudia", "origin": "Riyadh",
+                                                  "destination": "Jeddah", "price": 450})]),
+        vs.IDX_TRANSPORTS: _ft_reply([]),
+    })
+    monkeypatch.setattr(vs, "redis_async", fake)
+
+    flights, transports = asyncio.run(vs.asearch_many([
+        vs.plan_cheapest_flight("Riyadh", "Jeddah"),
+        vs.plan_cheapest_transport("Jeddah"),
+    ]))
+
+    assert flights[0]["id"] == "flight:F1" and flights[0]["price"] == pytest.approx(450.0)
+    assert transports == []
+    # Plain SORTBY queries carry no vector param
+    assert all("PARAMS" not in cmd for cmd in fake.pipelined)
+
+
+class FakeKeyspace:
+    """Only what invalidate_retrieval_cache touches: async SCAN + pipelined UNLINK."""
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.unlinked = []
+
+    async def scan_iter(self, match="*", count=None):
+        for key in sorted(self.keys):
+            if key.startswith(match.rstrip("*")):
+                yield key
+
+    def pipeline(self, transaction=True):
+        space, batches = self, []
+
+        class _Pipe:
+            def unlink(self, *keys):
+                batches.append(keys)
+
+            async def execute(self):
+                space.unlinked.extend(k for batch in batches for k in batch)
+                space.keys.difference_update(space.unlinked)
+                return [len(batch) for batch in batches]
+
+        return _Pipe()
+
+
+def test_invalidate_retrieval_cache_runs_on_the_async_client(monkeypatch):
+    fake = FakeKeyspace([
+        f"{retrievers.RETRIEVAL_CACHE_PREFIX}a",
+        f"{retrievers.RETRIEVAL_CACHE_PREFIX}b",
+        f"{retrievers.HUB_ROUTE_PREFIX}riyadh:jeddah",
+        "cities:hotels",
+    ])
+    monkeypatch.setattr(retrievers, "redis_async", fake)
+
+    assert asyncio.run(retrievers.invalidate_retrieval_cache()) == 3
+    assert fake.keys == {"cities:hotels"}
+
+
+def test_hub_route_keeps_first_viable_hub_and_caches_no_route_briefly(monkeypatch):
+    # Legs are planned origin→hub for every hub, then hub→destination.
+    # Doha is cheaper, but Dubai comes first in the hub priority list.
+    fares = {
+        ("Riyadh", "Dubai"): 400, ("Riyadh", "Doha"): 100,
+        ("Dubai", "Paris"): 900, ("Doha", "Paris"): 200,
+    }
+
+    async def fake_search_many(searches):
+        return [[{"origin": o, "destination": d, "price": p}] for (o, d), p in fares.items()]
+
+    async def no_fallback(*args, **kwargs):
+        return []
+
+    fake = FakeAsyncRedis({})
+    writes = []
+    monkeypatch.setattr(fake, "set", lambda key, value, ex=None: _record(writes, key, value, ex))
+    monkeypatch.setattr(retrievers, "redis_async", fake)
+    monkeypatch.setattr(retrievers, "_fallback_find", no_fallback)
+    monkeypatch.setattr(retrievers, "_safe_search_many", fake_search_many)
+
+    f1, f2 = asyncio.run(retrievers._best_hub_route("Riyadh", "Paris", ["Dubai", "Doha"]))
+    assert (f1["to"], f2["from"]) == ("Dubai", "Dubai")
+    assert writes[-1][2] == retrievers.settings.CACHE_TTL
+
+    async def empty_search_many(searches):
+        return [[] for _ in searches]
+
+    monkeypatch.setattr(retrievers, "_safe_search_many", empty_search_many)
+    assert asyncio.run(retrievers._best_hub_route("Riyadh", "Lima", ["Dubai", "Doha"])) is None
+    assert writes[-1][2] == retrievers.settings.HUB_ROUTE_NEGATIVE_TTL
+
+
+async def _record(writes, key, value, ex):
+    writes.append((key, value, ex))